@@ -1,284 +1,315 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from uuid import uuid4
-from datetime import datetime
-
-# Initialize the Flask app and the database
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cleansmrs.db'  # Unified database
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-# Define the Observation model (part of cleansmrs.db)
-class Observation(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
-    date = db.Column(db.Date, nullable=False)
-    time = db.Column(db.Time, nullable=False)
-    time_zone_offset = db.Column(db.String(10), nullable=False)
-    coordinates = db.Column(db.String(50), nullable=False)
-    temperature_water = db.Column(db.Float, nullable=True)
-    temperature_air = db.Column(db.Float, nullable=True)
-    humidity = db.Column(db.Float, nullable=True)
-    wind_speed = db.Column(db.Float, nullable=True)
-    wind_direction = db.Column(db.Float, nullable=True)
-    precipitation = db.Column(db.Float, nullable=True)
-    haze = db.Column(db.Float, nullable=True)
-    becquerel = db.Column(db.Float, nullable=True)
-    notes = db.Column(db.Text, nullable=True)
-    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
-    deleted = db.Column(db.DateTime, nullable=True)
-
-    def __repr__(self):
-        return f"<Observation {self.id}>"
-
-    @staticmethod
-    def create(date, time, time_zone_offset, coordinates, temperature_water=None, temperature_air=None,
-               humidity=None, wind_speed=None, wind_direction=None, precipitation=None, haze=None, becquerel=None, notes=None):
-        observation = Observation(
-            date=date,
-            time=time,
-            time_zone_offset=time_zone_offset,
-            coordinates=coordinates,
-            temperature_water=temperature_water,
-            temperature_air=temperature_air,
-            humidity=humidity,
-            wind_speed=wind_speed,
-            wind_direction=wind_direction,
-            precipitation=precipitation,
-            haze=haze,
-            becquerel=becquerel,
-            notes=notes
-        )
-        db.session.add(observation)
-        db.session.commit()
-        return observation
+from flask import Blueprint, Flask, Response, current_app, g, has_app_context, has_request_context, request, jsonify
+from flask.cli import with_appcontext
+from sqlalchemy import Engine, bindparam, delete, select
+from datetime import datetime, timedelta
+from functools import partial
+import atexit
+import os
+import click
+import time
+import routes
+import storage
+from broker import Broker
+from cache import LRUCache, create_cache
+from config import Config
+from ingest import WriteBehindQueue
+from metrics import COUNT_BUCKETS, SIZE_BUCKETS, Registry
+from models import db, DeviceLatest, Observation, ObservationRollup, bump_generation, migrate_derived_columns
+from rollups import GRANULARITIES, diff_rollups, rebuild_rollups, upsert_deltas
+from search import create_notes_index, rebuild_notes_index
+from routes import get_cold_archive, ingest_queue, insert_observations, observation_cache, observation_stream
+from serializers import METRIC_COLUMNS
+
+# Request and SQL instrumentation, served in Prometheus text format on /metrics
+registry = Registry()
+request_duration = registry.histogram('http_request_duration_seconds', "Time to handle a request", ('method', 'route'))
+requests_total = registry.counter('http_requests_total', "Requests handled, by status", ('method', 'route', 'status'))
+request_size = registry.histogram('http_request_size_bytes', "Request body size", ('method', 'route'), SIZE_BUCKETS)
+response_size = registry.histogram('http_response_size_bytes', "Response body size (streamed bodies are not counted)", ('method', 'route'), SIZE_BUCKETS)
+sql_queries_total = registry.counter('sql_queries_total', "SQL statements executed", ('route',))
+sql_query_duration = registry.histogram('sql_query_duration_seconds', "Time per SQL statement", ('route',))
+sql_queries_per_request = registry.histogram('sql_queries_per_request', "SQL statements run by one request", ('route',), COUNT_BUCKETS)
+sql_slow_queries_total = registry.counter('sql_slow_queries_total', "SQL statements slower than SLOW_QUERY_SECONDS", ('route',))
+registry.gauge('ingest_queue_depth', "Observations waiting in the write-behind queue", lambda: ingest_queue.stats()['depth'])
+registry.gauge('ingest_queue_lag_seconds', "Enqueue to commit time of the newest written observation", lambda: ingest_queue.stats()['last_lag'])
+registry.gauge('observation_cache_hits', "Single-observation cache hits", lambda: observation_cache.hits)
+registry.gauge('observation_cache_misses', "Single-observation cache misses", lambda: observation_cache.misses)
+registry.gauge('observation_stream_subscribers', "Clients connected to /observations/stream", lambda: observation_stream.subscribers)
+
+# Functions listed in the X-Profile-Summary header
+PROFILE_ENTRIES = 15
+
+# The URL rule rather than the path, so /observations/<id> is one series and not one per id
+def request_route():
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@db.event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('query_started', []).append(time.perf_counter())
+
+@db.event.listens_for(Engine, 'after_cursor_execute')
+def record_query(connection, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - connection.info['query_started'].pop()
+    route = request_route()
+    sql_queries_total.inc(route)
+    sql_query_duration.observe(elapsed, route)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+    if has_app_context() and elapsed >= current_app.config['SLOW_QUERY_SECONDS']:
+        sql_slow_queries_total.inc(route)
+        current_app.logger.warning("Slow SQL (%.3fs) on %s: %s", elapsed, route, ' '.join(statement.split())[:500])
+
+# A failed statement never reaches after_cursor_execute, so its timer is dropped here
+@db.event.listens_for(Engine, 'handle_error')
+def drop_query_timer(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    if current_app.config['PROFILE_REQUESTS'] and request.headers.get('X-Profile') == '1':
+        import cProfile  # Only loaded once profiling is switched on
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+# Record latency, status and sizes for every request, and tell the client where the time went
+# with a Server-Timing header (total and SQL time, statement count)
+def record_request(response):
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request_route()
+    request_duration.observe(elapsed, request.method, route)
+    requests_total.inc(request.method, route, str(response.status_code))
+    request_size.observe(request.content_length or 0, request.method, route)
+    if not response.is_streamed:
+        response_size.observe(response.calculate_content_length() or 0, request.method, route)
+    sql_queries_per_request.observe(g.sql_queries, route)
+    response.headers['Server-Timing'] = (
+        f'app;dur={elapsed * 1000:.1f}, db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_queries} queries"'
+    )
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        response.headers['X-Profile-Summary'] = profile_summary(profiler)
+    return response
+
+# The slowest functions by cumulative time as "file:line(function) total ms/calls" entries
+def profile_summary(profiler):
+    import pstats
+    entries = sorted(pstats.Stats(profiler).stats.items(), key=lambda item: item[1][3], reverse=True)
+    return '; '.join(
+        f"{os.path.basename(filename)}:{line}({function}) {cumulative * 1000:.1f}ms/{calls}"
+        for (filename, line, function), (_, calls, _, cumulative, _) in entries[:PROFILE_ENTRIES]
+    )
 
 # Create tables in the cleansmrs.db database
-def create_tables():
+def create_tables(app):
+    with app.app_context():
+        migrate_database()
+
+# Bring the schema up to date. A database from before the rollups gets them built from the observations it
+# already has, after the backfill (they're bucketed by observed_at_utc), so /observations/aggregate doesn't
+# answer from an empty table. Returns the rows backfilled and the rollup rows built (None if they existed).
+def migrate_database():
+    had_rollups = db.inspect(db.engine).has_table(ObservationRollup.__tablename__)
+    db.create_all()
+    backfilled = migrate_derived_columns()
+    return backfilled, None if had_rollups else rebuild_all_rollups()
+
+# flask --app app migrate
+@click.command('migrate')
+@with_appcontext
+def migrate_command():
+    backfilled, rollups = migrate_database()
+    print(f"Backfilled derived columns for {backfilled} observations")
+    if rollups is not None:
+        print(f"Built {rollups} rollup rows")
+
+# Rebuild the rollups from the live rows and the archive's aggregates
+def rebuild_all_rollups():
+    with db.engine.begin() as connection:
+        count = rebuild_rollups(connection, ObservationRollup.__table__, Observation.__table__)
+        upsert_deltas(connection, ObservationRollup.__table__, archived_rollup_deltas())
+    return count
+
+# flask --app app rebuild-rollups
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    db.create_all()
+    print(f"Rebuilt {rebuild_all_rollups()} rollup rows")
+
+# Differences check-rollups prints before the count
+SHOWN_DIFFERENCES = 20
+
+# flask --app app check-rollups: compare the incrementally maintained rollups with what rebuild-rollups
+# would write (live rows plus the archive), without changing anything; exits with 1 if any row differs
+@click.command('check-rollups')
+@with_appcontext
+def check_rollups_command():
+    with db.engine.connect() as connection:
+        differences = diff_rollups(connection, ObservationRollup.__table__, Observation.__table__, archived_rollup_deltas())
+    for (granularity, bucket, metric), stored, expected in differences[:SHOWN_DIFFERENCES]:
+        print(f"{granularity} {bucket} {metric}: stored {stored}, rebuild {expected}")
+    print(f"{len(differences)} rollup rows differ from a rebuild")
+    if differences:
+        raise SystemExit(1)
+
+# flask --app app rebuild-search (if the notes search index ever falls out of step with the notes)
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    with db.engine.begin() as connection:
+        if not create_notes_index(connection):
+            rebuild_notes_index(connection)
+    print("Rebuilt the notes search index")
+
+# The rollup deltas of every archived observation, from the archive's own per-bucket aggregates
+def archived_rollup_deltas():
+    deltas = {}
+    cold_archive = get_cold_archive()
+    if cold_archive is None:
+        return deltas
+    for granularity in GRANULARITIES:
+        for bucket, values in cold_archive.aggregate(granularity, METRIC_COLUMNS).items():
+            for metric, (count, total, minimum, maximum) in values.items():
+                if count:
+                    deltas[(granularity, bucket, metric)] = [count, total, minimum, maximum]
+    return deltas
+
+# Observations moved to the archive per round trip
+ARCHIVE_CHUNK_SIZE = 50000
+
+# Move live observations from whole months before `before` into the cold archive. Each chunk is written
+# to the archive before its rows are deleted here, and archiving a row twice just replaces it, so an
+# interrupted run can simply be repeated. Rollups are left alone: they still cover archived rows.
+# Archived rows can still be read by id but not changed (PUT and DELETE answer 409).
+# Soft-deleted rows stay for the change feed and each device's latest reading stays for /devices.
+def archive_observations(before):
+    from archive import ARCHIVED_COLUMNS
+
+    cold_archive = get_cold_archive(create=True)
+    cutoff = before.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    table = Observation.__table__
+    statement = (
+        select(*[table.c[name] for name in ARCHIVED_COLUMNS])
+        .where(
+            table.c.observed_at_utc < cutoff,
+            table.c.deleted.is_(None),
+            table.c.id.not_in(select(DeviceLatest.observation_id))
+        )
+        .order_by(table.c.observed_at_utc, table.c.id)
+        .limit(ARCHIVE_CHUNK_SIZE)
+    )
+    moved = 0
+    while True:
+        rows = db.session.execute(statement).mappings().all()
+        if not rows:
+            db.session.commit()  # Hands the connection back (on SQLite, the worker's only write connection)
+            return moved
+        cold_archive.append(rows)
+        db.session.execute(delete(table).where(table.c.id == bindparam('row_id')), [{'row_id': row['id']} for row in rows])
+        bump_generation(db.session.connection())
+        db.session.commit()
+        moved += len(rows)
+
+# flask --app app archive [--days N]
+@click.command('archive')
+@click.option('--days', type=int, default=None, help="Archive observations older than this many days")
+@with_appcontext
+def archive_command(days):
+    db.create_all()
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    moved = archive_observations(datetime.utcnow() - timedelta(days=days))
+    print(f"Archived {moved} observations ({len(get_cold_archive(create=True))} in the archive)")
+
+# The background writer runs outside any request, so it needs its own app context
+def write_queued_observations(app, rows):
     with app.app_context():
-        db.create_all()
+        insert_observations(rows, status=202)
+
+# A queued row that couldn't be written: forget its idempotency key, so the device's retry is queued
+# again instead of being answered as already accepted
+def drop_queued_observation(app, row):
+    if row.get('idempotency_key'):
+        app.extensions['seen_keys'].delete(row['idempotency_key'])
 
-@app.route('/')
+# Endpoints for operators rather than devices: health, metrics and cache/queue stats
+ops = Blueprint('ops', __name__)
+
+@ops.route('/')
 def home():
     return "Welcome to the CleanSMRS API!"
 
-# API endpoint to create a new observation
-@app.route('/observations', methods=['POST'])
-def create_observation():
-    data = request.get_json()  # Get the JSON data from the request
-    
-    # Extract data from the JSON body
-    date = data.get('date')
-    time = data.get('time')
-    time_zone_offset = data.get('time_zone_offset')
-    coordinates = data.get('coordinates')
-    temperature_water = data.get('temperature_water')
-    temperature_air = data.get('temperature_air')
-    humidity = data.get('humidity')
-    wind_speed = data.get('wind_speed')
-    wind_direction = data.get('wind_direction')
-    precipitation = data.get('precipitation')
-    haze = data.get('haze')
-    becquerel = data.get('becquerel')
-    notes = data.get('notes')
-
-    try:
-        # Convert date and time from strings to Python objects
-        date = datetime.strptime(date, '%Y-%m-%d').date()
-        time = datetime.strptime(time, '%H:%M:%S').time()
-
-        # Call the create method on the Observation model
-        observation = Observation.create(
-            date=date,
-            time=time,
-            time_zone_offset=time_zone_offset,
-            coordinates=coordinates,
-            temperature_water=temperature_water,
-            temperature_air=temperature_air,
-            humidity=humidity,
-            wind_speed=wind_speed,
-            wind_direction=wind_direction,
-            precipitation=precipitation,
-            haze=haze,
-            becquerel=becquerel,
-            notes=notes
-        )
-        return jsonify({"message": "Observation created successfully", "data": observation.id}), 201
-    except Exception as e:
-        return jsonify({"error": f"Failed to create observation: {str(e)}"}), 400
-
-# API endpoint to get all observations
-@app.route('/observations', methods=['GET'])
-def get_observations():
-    observations = Observation.query.all()  # Fetch all observations from the database
-    # Serialize observations (convert them into JSON)
-    observations_list = []
-    for observation in observations:
-        observations_list.append({
-            "id": observation.id,
-            "date": observation.date.strftime('%Y-%m-%d'),
-            "time": observation.time.strftime('%H:%M:%S'),
-            "time_zone_offset": observation.time_zone_offset,
-            "coordinates": observation.coordinates,
-            "temperature_water": observation.temperature_water,
-            "temperature_air": observation.temperature_air,
-            "humidity": observation.humidity,
-            "wind_speed": observation.wind_speed,
-            "wind_direction": observation.wind_direction,
-            "precipitation": observation.precipitation,
-            "haze": observation.haze,
-            "becquerel": observation.becquerel,
-            "notes": observation.notes,
-            "created": observation.created.strftime('%Y-%m-%d %H:%M:%S'),
-            "updated": observation.updated.strftime('%Y-%m-%d %H:%M:%S') if observation.updated else None,
-            "deleted": observation.deleted.strftime('%Y-%m-%d %H:%M:%S') if observation.deleted else None
-        })
-    
-    return jsonify(observations_list), 200
-
-# API endpoint to delete an observation by its ID
-@app.route('/observations/<string:id>', methods=['DELETE'])
-def delete_observation(id):
-    observation = Observation.query.get(id)
-    if observation is None:
-        return jsonify({"error": "Observation not found"}), 404
-
-    db.session.delete(observation)
-    db.session.commit()
-
-    return jsonify({"message": f"Observation {id} deleted successfully"}), 200
-
-# API endpoint to get an observation by its ID
-@app.route('/observations/<string:id>', methods=['GET'])
-def get_observation(id):
-    observation = Observation.query.filter_by(id=id).first()
-    
-    if observation is None:
-        return jsonify({"error": "Observation not found"}), 404
-
-    # Serialize observation to return it as JSON
-    observation_data = {
-        "id": observation.id,
-        "date": observation.date.strftime('%Y-%m-%d'),
-        "time": observation.time.strftime('%H:%M:%S'),
-        "time_zone_offset": observation.time_zone_offset,
-        "coordinates": observation.coordinates,
-        "temperature_water": observation.temperature_water,
-        "temperature_air": observation.temperature_air,
-        "humidity": observation.humidity,
-        "wind_speed": observation.wind_speed,
-        "wind_direction": observation.wind_direction,
-        "precipitation": observation.precipitation,
-        "haze": observation.haze,
-        "becquerel": observation.becquerel,
-        "notes": observation.notes,
-        "created": observation.created.strftime('%Y-%m-%d %H:%M:%S'),
-        "updated": observation.updated.strftime('%Y-%m-%d %H:%M:%S') if observation.updated else None,
-        "deleted": observation.deleted.strftime('%Y-%m-%d %H:%M:%S') if observation.deleted else None
-    }
-
-    return jsonify(observation_data), 200
-
-# API endpoint to update an observation by its ID
-@app.route('/observations/<string:id>', methods=['PUT'])
-def update_observation(id):
-    observation = Observation.query.get(id)
-    if observation is None:
-        return jsonify({"error": "Observation not found"}), 404
-
-    data = request.get_json()  # Get the updated data from the request
-
-    # Update the fields of the observation if provided
-    if 'date' in data:
-        observation.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-    if 'time' in data:
-        observation.time = datetime.strptime(data['time'], '%H:%M:%S').time()
-    if 'time_zone_offset' in data:
-        observation.time_zone_offset = data['time_zone_offset']
-    if 'coordinates' in data:
-        observation.coordinates = data['coordinates']
-    if 'temperature_water' in data:
-        observation.temperature_water = data.get('temperature_water')
-    if 'temperature_air' in data:
-        observation.temperature_air = data.get('temperature_air')
-    if 'humidity' in data:
-        observation.humidity = data.get('humidity')
-    if 'wind_speed' in data:
-        observation.wind_speed = data.get('wind_speed')
-    if 'wind_direction' in data:
-        observation.wind_direction = data.get('wind_direction')
-    if 'precipitation' in data:
-        observation.precipitation = data.get('precipitation')
-    if 'haze' in data:
-        observation.haze = data.get('haze')
-    if 'becquerel' in data:
-        observation.becquerel = data.get('becquerel')
-    if 'notes' in data:
-        observation.notes = data.get('notes')
-
-    # Commit the changes to the database
-    db.session.commit()
-
-    return jsonify({"message": "Observation updated successfully", "data": observation.id}), 200
+# API endpoint for Prometheus to scrape this worker's request, SQL, queue and cache metrics
+@ops.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# API endpoint to see the async ingest queue's depth, lag and throughput
+@ops.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    return jsonify(dict(ingest_queue.stats(), enabled=current_app.config['ASYNC_INGEST'])), 200
+
+# API endpoint to see how well the single-observation cache is doing
+@ops.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(observation_cache.stats()), 200
+
+# API endpoint to see this worker's live stream subscribers and buffered events
+@ops.route('/stream/stats', methods=['GET'])
+def stream_stats():
+    return jsonify(observation_stream.stats()), 200
+
+# Build the app: config, the one engine, the per-app services and the blueprints.
+# Nothing here touches the database, so workers start without a query; tables are created
+# by `flask --app app migrate` (or `python app.py`), never on the request path.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+    if not app.config['ARCHIVE_DIR']:
+        app.config['ARCHIVE_DIR'] = os.path.join(app.instance_path, 'archive')
+
+    storage.init_app(app)  # The one write engine, plus the read-only pool
+    app.extensions['observation_cache'] = create_cache(app.config)
+    app.extensions['seen_keys'] = LRUCache(max_size=app.config['SEEN_KEYS_SIZE'], ttl=app.config['SEEN_KEYS_TTL'])
+    queue = app.extensions['ingest_queue'] = WriteBehindQueue(
+        partial(write_queued_observations, app),
+        max_size=app.config['INGEST_QUEUE_SIZE'],
+        batch_size=app.config['INGEST_BATCH_SIZE'],
+        flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+        on_failure=partial(drop_queued_observation, app)
+    )
+    atexit.register(queue.close)  # Flush whatever is still queued on shutdown
+    app.extensions['observation_stream'] = Broker(backlog=app.config['STREAM_BACKLOG'])
+
+    app.before_request(start_request_timer)
+    app.after_request(record_request)
+    if app.config['JWT_REQUIRED']:
+        from flask_jwt_extended import JWTManager, verify_jwt_in_request
+        JWTManager(app)
+
+        def require_token():
+            if request.blueprint == routes.bp.name:
+                verify_jwt_in_request()
+        app.before_request(require_token)
+
+    app.register_blueprint(ops)
+    app.register_blueprint(routes.bp)
+    for command in (migrate_command, rebuild_rollups_command, check_rollups_command, rebuild_search_command, archive_command):
+        app.cli.add_command(command)
+    return app
 
 if __name__ == '__main__':
-    create_tables()  # Create the tables explicitly within the app context
+    app = create_app()
+    create_tables(app)  # Create the tables explicitly within the app context
     app.run(debug=True)
-
-
-
-
-
-
-
-# not working properly the below as its not letting me take a specific observation from certain dete
-@app.route('/observations/range', methods=['GET'])
-def get_observations_by_date_range():
-    # Get start_date and end_date from query parameters
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-
-    if not start_date or not end_date:
-        return jsonify({"error": "Both start_date and end_date are required"}), 400
-
-    try:
-        # Convert string to datetime objects
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-
-        # Query the database for observations within the date range
-        observations = Observation.query.filter(Observation.date >= start_date, Observation.date <= end_date).all()
-
-        # If no observations are found
-        if not observations:
-            return jsonify({"message": "No observations found in the specified date range"}), 404
-
-        # Serialize observations to JSON
-        observations_list = []
-        for observation in observations:
-            observations_list.append({
-                "id": observation.id,
-                "date": observation.date.strftime('%Y-%m-%d'),
-                "time": observation.time.strftime('%H:%M:%S'),
-                "time_zone_offset": observation.time_zone_offset,
-                "coordinates": observation.coordinates,
-                "temperature_water": observation.temperature_water,
-                "temperature_air": observation.temperature_air,
-                "humidity": observation.humidity,
-                "wind_speed": observation.wind_speed,
-                "wind_direction": observation.wind_direction,
-                "precipitation": observation.precipitation,
-                "haze": observation.haze,
-                "becquerel": observation.becquerel,
-                "notes": observation.notes,
-                "created": observation.created.strftime('%Y-%m-%d %H:%M:%S'),
-                "updated": observation.updated.strftime('%Y-%m-%d %H:%M:%S') if observation.updated else None,
-                "deleted": observation.deleted.strftime('%Y-%m-%d %H:%M:%S') if observation.deleted else None
-            })
-
-        return jsonify(observations_list), 200
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
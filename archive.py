@@ -0,0 +1,406 @@
+# Cold tier: observations older than the hot table keeps, as one directory of NumPy column files per month.
+#
+#   <ARCHIVE_DIR>/2023-04.2/observed_at_utc.npy, id.npy, becquerel.npy, ...
+#
+# Months are by observed_at_utc and rows are sorted by (observed_at_utc, id), so time ranges are a
+# binary search. date_time_order.npy is the permutation that sorts the month by (date, time, id) for
+# the default list order, and date_time_key.npy holds the local timestamps in that order to seek in.
+# Files are opened memory-mapped, so a scan only pages in the columns it touches.
+#
+# A month is never modified in place: appending writes the next version beside it and removes the old
+# one, so readers holding the old memmaps keep a consistent view. Cold rows are never soft-deleted.
+from datetime import datetime
+from threading import Lock
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM
+from query import COMPARISONS
+from serializers import METRIC_COLUMNS
+
+# Stored columns and their dtypes; None is NaN/NaT, -1 for grid_cell and '' for strings
+STRING_COLUMNS = ['id', 'time_zone_offset', 'coordinates', 'notes', 'device_id']
+COLUMN_TYPES = dict(
+    {name: 'datetime64[us]' for name in ('observed_at_utc', 'created', 'updated')},
+    date='datetime64[D]',
+    time='timedelta64[us]',
+    latitude='float64',
+    longitude='float64',
+    grid_cell='int64',
+    **{name: 'float64' for name in METRIC_COLUMNS},
+    **{name: 'str' for name in STRING_COLUMNS},
+)
+ARCHIVED_COLUMNS = list(COLUMN_TYPES)
+
+# Sort keys the archive can page through, as the hot table's key column names
+OBSERVED_AT_KEY = ('observed_at_utc', 'id')
+DATE_TIME_KEY = ('date', 'time', 'id')
+
+# Largest gap between a reading's local date/time and its UTC time (UTC-12 to UTC+14)
+MAX_OFFSET = np.timedelta64(1, 'D')
+
+# numpy datetime64 units for the aggregate buckets
+BUCKET_UNITS = {'minute': 'm', 'hour': 'h', 'day': 'D'}
+
+MIDNIGHT = datetime(2000, 1, 1)
+
+
+def month_of(moment):
+    return moment.strftime('%Y-%m')
+
+
+def month_bounds(month):
+    start = np.datetime64(month, 'M')
+    return start.astype('datetime64[us]'), (start + 1).astype('datetime64[us]')
+
+
+def _to_array(name, values):
+    dtype = COLUMN_TYPES[name]
+    if name == 'time':
+        return np.array([(value.hour * 3600 + value.minute * 60 + value.second) * 1000000 + value.microsecond
+                         for value in values], dtype='int64').astype(dtype)
+    if name == 'grid_cell':
+        return np.array([-1 if value is None else value for value in values], dtype=dtype)
+    if dtype == 'str':
+        return np.array(['' if value is None else value for value in values], dtype=str)
+    return np.array(values, dtype=dtype)
+
+
+def _to_python(name, value):
+    dtype = COLUMN_TYPES.get(name)
+    if dtype is None:  # deleted: cold rows are always live
+        return None
+    if name == 'time':
+        return (MIDNIGHT + value.item()).time()
+    if dtype == 'str':
+        return str(value) or None
+    if name == 'grid_cell':
+        return None if value < 0 else int(value)
+    if dtype == 'float64':
+        return None if np.isnan(value) else float(value)
+    return None if np.isnat(value) else value.item()
+
+
+# The sort key as one int64 (microseconds) plus the id, so (primary, id) compares like the SQL key
+def _primary(columns, key):
+    if key == OBSERVED_AT_KEY:
+        return np.asarray(columns['observed_at_utc']).view('int64')
+    return np.asarray(columns['date']).astype('datetime64[us]').view('int64') + np.asarray(columns['time']).view('int64')
+
+
+def _cursor_primary(cursor, key):
+    if key == OBSERVED_AT_KEY:
+        moment = cursor[0]
+    else:
+        moment = datetime.combine(cursor[0], cursor[1])
+    return np.datetime64(moment, 'us').astype('int64'), cursor[-1]
+
+
+# Any other key is one column plus the id, e.g. ('becquerel', 'id')
+def _key_values(columns, key, indexes):
+    if key in (OBSERVED_AT_KEY, DATE_TIME_KEY):
+        return _primary({name: columns[name][indexes] for name in key[:-1]}, key)
+    return np.asarray(columns[key[0]][indexes])
+
+
+def _cursor_key(cursor, key):
+    if key in (OBSERVED_AT_KEY, DATE_TIME_KEY):
+        return _cursor_primary(cursor, key)
+    return cursor[0], cursor[-1]
+
+
+# Which stored values stand for NULL
+def _present(name, values):
+    dtype = COLUMN_TYPES[name]
+    if dtype == 'str':
+        return values != ''
+    if dtype == 'float64':
+        return ~np.isnan(values)
+    if dtype.startswith(('datetime64', 'timedelta64')):
+        return ~np.isnat(values)
+    return np.ones(len(values), dtype=bool)
+
+
+# Rows matching every query.py condition; like SQL, no comparison matches a NULL
+def _where_mask(columns, indexes, where):
+    mask = np.ones(len(indexes), dtype=bool)
+    for name, op, value in where:
+        values = np.asarray(columns[name][indexes])
+        present = _present(name, values)
+        if op == 'isnull':
+            mask &= ~present if value else present
+            continue
+        targets = _to_array(name, list(value) if op in ('between', 'in') else [value])
+        if op == 'in':
+            matched = np.isin(values, targets)
+        elif op == 'between':
+            matched = (values >= targets[0]) & (values <= targets[1])
+        else:
+            matched = COMPARISONS[op](values, targets[0])
+        mask &= present & matched
+    return mask
+
+
+# Rows inside bbox=(min_lat, min_lon, max_lat, max_lon) and within near=(lat, lon, radius_km)
+def _spatial_mask(latitudes, longitudes, bbox, near):
+    mask = np.ones(len(latitudes), dtype=bool)
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        mask &= (latitudes >= min_lat) & (latitudes <= max_lat) & (longitudes >= min_lon) & (longitudes <= max_lon)
+    if near is not None:
+        latitude, longitude, radius_km = near
+        mask &= haversine_km(latitudes, longitudes, latitude, longitude) <= radius_km
+    return mask
+
+
+# Distance in km from one point to arrays of points
+def haversine_km(latitudes, longitudes, latitude, longitude):
+    lat1, lat2 = np.radians(latitudes), np.radians(latitude)
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(longitude - longitudes) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class ColdArchive:
+    def __init__(self, directory):
+        self.directory = directory
+        self._loaded = {}
+        self._lock = Lock()
+
+    # {month: directory name} for the newest version of every archived month
+    def _versions(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {}
+        versions = {}
+        for name in names:
+            month, _, version = name.partition('.')
+            if not version.isdigit():
+                continue
+            if month not in versions or int(version) > int(versions[month].partition('.')[2]):
+                versions[month] = name
+        return versions
+
+    # Archived months overlapping [start, end], oldest first
+    def months(self, start=None, end=None):
+        months = sorted(self._versions().items())
+        if start is not None:
+            months = [(month, name) for month, name in months if month >= month_of(start)]
+        if end is not None:
+            months = [(month, name) for month, name in months if month <= month_of(end)]
+        return months
+
+    # Every column of one month version, memory-mapped and kept open for later requests
+    def load(self, name):
+        with self._lock:
+            columns = self._loaded.get(name)
+            if columns is None:
+                path = os.path.join(self.directory, name)
+                columns = {column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+                           for column in ARCHIVED_COLUMNS + ['date_time_order', 'date_time_key']}
+                self._loaded = {loaded: value for loaded, value in self._loaded.items() if loaded.partition('.')[0] != name.partition('.')[0]}
+                self._loaded[name] = columns
+            return columns
+
+    def __len__(self):
+        return sum(len(self.load(name)['id']) for _, name in self.months())
+
+    # Add rows (dicts with every archived column) to their months. Rows already archived under the
+    # same id are replaced, so re-running an interrupted archive job is harmless.
+    def append(self, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(month_of(row['observed_at_utc']), []).append(row)
+        versions = self._versions()
+        for month, month_rows in by_month.items():
+            columns = {name: _to_array(name, [row[name] for row in month_rows]) for name in ARCHIVED_COLUMNS}
+            previous = versions.get(month)
+            if previous is not None:
+                existing = self.load(previous)
+                keep = ~np.isin(existing['id'], columns['id'])
+                columns = {name: np.concatenate([np.asarray(existing[name])[keep], columns[name]]) for name in ARCHIVED_COLUMNS}
+            self._write(month, previous, columns)
+        return len(by_month)
+
+    def _write(self, month, previous, columns):
+        order = np.lexsort((columns['id'], columns['observed_at_utc']))
+        columns = {name: values[order] for name, values in columns.items()}
+        local = _primary(columns, DATE_TIME_KEY)
+        columns['date_time_order'] = np.lexsort((columns['id'], local))
+        columns['date_time_key'] = local[columns['date_time_order']]
+
+        os.makedirs(self.directory, exist_ok=True)
+        version = int(previous.partition('.')[2]) + 1 if previous else 1
+        staging = os.path.join(self.directory, f'.{month}.{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        for name, values in columns.items():
+            np.save(os.path.join(staging, f'{name}.npy'), values)
+        os.rename(staging, os.path.join(self.directory, f'{month}.{version}'))
+        if previous:
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+
+    # Up to `limit` rows in key order (or reverse key order) after the cursor, as tuples of the requested
+    # fields followed by the key values (the same shape as the hot table's paged selects). Filters mirror the
+    # SQL ones: start/end on observed_at_utc, bbox=(min_lat, min_lon, max_lat, max_lon), near=(lat, lon,
+    # radius_km) and `where`, a list of query.py conditions.
+    def select(self, fields, key, limit, after=None, start=None, end=None, end_exclusive=False, bbox=None, near=None,
+               where=(), descending=False):
+        cursor = _cursor_key(after, key) if after is not None else None
+        months = self.months(start, end)
+        found = []  # (key value, id, month name, row index)
+        for month, name in reversed(months) if descending else months:
+            if len(found) >= limit and self._past(month, key, descending, found[limit - 1]):
+                break
+            columns = self.load(name)
+            if descending or key not in (OBSERVED_AT_KEY, DATE_TIME_KEY):
+                found += self._sorted_scan(name, columns, key, limit, cursor, descending, start, end, end_exclusive, bbox, near, where)
+            else:
+                found += self._scan(name, columns, key, limit, cursor, start, end, end_exclusive, bbox, near, where)
+            found.sort(reverse=descending)
+            del found[limit:]
+        return [self._row(self.load(name), index, fields, key) for _, _, name, index in found]
+
+    # Whether every row of `month` sorts after the last row found so far, so no later month can contribute.
+    # Only the time keys line up with months; rows of any other key may be in any month.
+    def _past(self, month, key, descending, last):
+        if key not in (OBSERVED_AT_KEY, DATE_TIME_KEY):
+            return False
+        month_start, month_end = month_bounds(month)
+        margin = MAX_OFFSET if key == DATE_TIME_KEY else np.timedelta64(0, 'us')
+        if descending:
+            return (month_end + margin).astype('int64') < last[0]
+        return ((month_start - margin).astype('int64'), '') > last[:2]
+
+    # The first `limit` matching rows of one month, walking it in key order from the cursor
+    def _scan(self, name, columns, key, limit, cursor, start, end, end_exclusive, bbox, near, where=()):
+        observed = columns['observed_at_utc']
+        if key == OBSERVED_AT_KEY:
+            order, sorted_key = None, _primary(columns, key)
+            first, last = self._time_slice(observed, start, end, end_exclusive)
+        else:
+            order, sorted_key = columns['date_time_order'], columns['date_time_key']
+            first, last = 0, len(observed)
+        if cursor is not None:
+            first = max(first, int(np.searchsorted(sorted_key, cursor[0], side='left')))
+
+        found = []
+        chunk = max(4 * limit, 4096)
+        position = first
+        while position < last and len(found) < limit:
+            positions = np.arange(position, min(position + chunk, last))
+            indexes = positions if order is None else np.asarray(order[positions])
+            position += chunk
+            values = np.asarray(sorted_key[positions])
+            ids = columns['id'][indexes]
+            mask = np.ones(len(indexes), dtype=bool)
+            if cursor is not None:
+                mask &= (values > cursor[0]) | ((values == cursor[0]) & (ids > cursor[1]))
+            if order is not None and (start is not None or end is not None):
+                moments = observed[indexes]
+                if start is not None:
+                    mask &= moments >= np.datetime64(start, 'us')
+                if end is not None:
+                    mask &= moments < np.datetime64(end, 'us') if end_exclusive else moments <= np.datetime64(end, 'us')
+            if bbox is not None or near is not None:
+                mask &= _spatial_mask(columns['latitude'][indexes], columns['longitude'][indexes], bbox, near)
+            if where:
+                mask &= _where_mask(columns, indexes, where)
+            for match in np.flatnonzero(mask)[:limit - len(found)]:
+                found.append((int(values[match]), str(ids[match]), name, int(indexes[match])))
+        return found
+
+    # The first `limit` matching rows of one month in any key order: filter the month's time slice,
+    # then sort only the rows left by (key value, id)
+    def _sorted_scan(self, name, columns, key, limit, cursor, descending, start, end, end_exclusive, bbox, near, where):
+        first, last = self._time_slice(columns['observed_at_utc'], start, end, end_exclusive)
+        indexes = np.arange(first, last)
+        if bbox is not None or near is not None:
+            indexes = indexes[_spatial_mask(columns['latitude'][indexes], columns['longitude'][indexes], bbox, near)]
+        if where:
+            indexes = indexes[_where_mask(columns, indexes, where)]
+        values = _key_values(columns, key, indexes)
+        ids = np.asarray(columns['id'][indexes])
+        if cursor is not None:
+            if descending:
+                keep = (values < cursor[0]) | ((values == cursor[0]) & (ids < cursor[1]))
+            else:
+                keep = (values > cursor[0]) | ((values == cursor[0]) & (ids > cursor[1]))
+            indexes, values, ids = indexes[keep], values[keep], ids[keep]
+        order = np.lexsort((ids, values))
+        order = order[::-1][:limit] if descending else order[:limit]
+        return [(values[match].item(), str(ids[match]), name, int(indexes[match])) for match in order]
+
+    # Row positions of the sorted timestamps inside [start, end]
+    def _time_slice(self, observed, start, end, end_exclusive):
+        first = int(np.searchsorted(observed, np.datetime64(start, 'us'))) if start is not None else 0
+        last = len(observed)
+        if end is not None:
+            last = int(np.searchsorted(observed, np.datetime64(end, 'us'), side='left' if end_exclusive else 'right'))
+        return first, last
+
+    def _row(self, columns, index, fields, key):
+        return tuple(_to_python(name, columns[name][index] if name in columns else None) for name in list(fields) + list(key))
+
+    # Every archived row in key order, `chunk_size` rows at a time (for exports)
+    def iter_rows(self, fields, key, chunk_size=1000):
+        after = None
+        while True:
+            rows = self.select(fields, key, chunk_size, after=after)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = rows[-1][-len(key):]
+
+    # observed_at_utc as seconds since 1970 and {metric: float array} for the archived rows matching the
+    # filters, sliced straight out of the memory-mapped columns in time order
+    def metric_columns(self, metrics, start=None, end=None, end_exclusive=False, bbox=None, near=None, device_id=None):
+        times, columns = [], {metric: [] for metric in metrics}
+        for month, name in self.months(start, end):
+            month_columns = self.load(name)
+            first, last = self._time_slice(month_columns['observed_at_utc'], start, end, end_exclusive)
+            if first >= last:
+                continue
+            mask = np.ones(last - first, dtype=bool)
+            if device_id is not None:
+                mask &= month_columns['device_id'][first:last] == device_id
+            if bbox is not None or near is not None:
+                mask &= _spatial_mask(month_columns['latitude'][first:last], month_columns['longitude'][first:last], bbox, near)
+            times.append(_primary(month_columns, OBSERVED_AT_KEY)[first:last][mask] / 1e6)
+            for metric in metrics:
+                columns[metric].append(np.asarray(month_columns[metric][first:last])[mask])
+        if not times:
+            return np.empty(0), {metric: np.empty(0) for metric in metrics}
+        return np.concatenate(times), {metric: np.concatenate(values) for metric, values in columns.items()}
+
+    # {bucket start: {metric: (count, sum, min, max)}} for archived rows in [start, end], computed per month
+    # with one pass of numpy reductions over the already-sorted timestamps
+    def aggregate(self, bucket, metrics, start=None, end=None, end_exclusive=False):
+        unit = BUCKET_UNITS[bucket]
+        result = {}
+        for month, name in self.months(start, end):
+            columns = self.load(name)
+            observed = columns['observed_at_utc']
+            first, last = self._time_slice(observed, start, end, end_exclusive)
+            if first >= last:
+                continue
+
+            buckets = np.asarray(observed[first:last]).astype(f'datetime64[{unit}]')
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            for metric in metrics:
+                values = np.asarray(columns[metric][first:last])
+                present = ~np.isnan(values)
+                counts = np.add.reduceat(present.astype('int64'), starts)
+                sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+                minimums = np.minimum.reduceat(np.where(present, values, np.inf), starts)
+                maximums = np.maximum.reduceat(np.where(present, values, -np.inf), starts)
+                for position, bucket_start in enumerate(buckets[starts]):
+                    entry = result.setdefault(bucket_start.astype('datetime64[us]').item(), {})
+                    count = int(counts[position])
+                    entry[metric] = (count, float(sums[position]),
+                                     float(minimums[position]) if count else None,
+                                     float(maximums[position]) if count else None)
+        return result
@@ -0,0 +1,425 @@
+# Load test for the observation API: seed a throwaway SQLite database with synthetic observations, then drive
+# create, batch create, list, get, range, update and delete through the Flask test client and through a real
+# multi-worker HTTP server, and print throughput and latency percentiles as JSON.
+#
+# Run from the repository root:
+#   python benchmarks/api_bench.py --rows 100000 --requests 500 --workers 4 --concurrency 8 > baseline.json
+#
+# --mode client|server|both picks the drivers. The server is gunicorn when it is installed, otherwise N pre-forked
+# werkzeug processes accepting on one shared socket. --database keeps the seeded file; with --reuse, a database
+# that already has enough rows is not seeded again (seeding 10M rows takes a while).
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The seeded observations span this period, one device per station
+SEED_START = datetime(2022, 1, 1)
+SEED_DAYS = 730
+STATIONS = 200
+SEED_CHUNK_SIZE = 20000
+BATCH_SIZE = 100
+PAGE_SIZE = 100
+OPERATIONS = ['create', 'batch', 'list', 'get', 'range', 'update', 'delete']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a throwaway SQLite database with synthetic observations, drive the "
+                                                 "observation API through the test client and a multi-worker HTTP server, "
+                                                 "and print throughput and latency percentiles as JSON.")
+    parser.add_argument('--rows', type=int, default=10000, help="observations to seed (10k to 10M)")
+    parser.add_argument('--requests', type=int, default=200, help="requests per operation and driver")
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=4, help="server worker processes")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads sending to the server")
+    parser.add_argument('--database', help="SQLite file to seed and use (default: a temporary file)")
+    parser.add_argument('--reuse', action='store_true', help="don't reseed a database that already has --rows rows")
+    parser.add_argument('--rollups', action='store_true', help="rebuild the rollup table after seeding")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)  # internal: run the server
+    return parser.parse_args(argv)
+
+
+# Point the app at the benchmark database before it is imported
+def use_database(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['ARCHIVE_DIR'] = os.path.join(os.path.dirname(os.path.abspath(path)), 'archive')
+
+
+def count_rows(path):
+    if not os.path.exists(path):
+        return 0
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT count(*) FROM observation').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        connection.close()
+
+
+def format_offset(hours):
+    return f"{'-' if hours < 0 else '+'}{abs(hours):02d}:00"
+
+
+# One chunk of synthetic rows, ready for a bulk insert (derived columns included)
+def synthetic_rows(rng, count, now):
+    from geo import grid_cell
+
+    seconds = rng.integers(0, SEED_DAYS * 86400, count)
+    offsets = rng.choice([-8, -5, 0, 1, 2, 9], count)
+    stations = rng.integers(0, STATIONS, count)
+    latitudes = np.round(35 + (stations % 20) * 1.1 + rng.normal(0, 0.01, count), 5)
+    longitudes = np.round(-10 + (stations // 20) * 3.3 + rng.normal(0, 0.01, count), 5)
+    readings = {
+        'temperature_water': rng.normal(12, 4, count), 'temperature_air': rng.normal(15, 6, count),
+        'humidity': rng.uniform(20, 100, count), 'wind_speed': rng.gamma(2, 2, count),
+        'wind_direction': rng.uniform(0, 360, count), 'precipitation': rng.exponential(0.5, count),
+        'haze': rng.uniform(0, 1, count), 'becquerel': rng.normal(0.4, 0.05, count),
+    }
+    readings = {name: np.round(values, 3).tolist() for name, values in readings.items()}
+    rows = []
+    for index in range(count):
+        observed_at = SEED_START + timedelta(seconds=int(seconds[index]))
+        local = observed_at + timedelta(hours=int(offsets[index]))
+        latitude, longitude = float(latitudes[index]), float(longitudes[index])
+        row = {
+            'id': f'{rng.integers(0, 2 ** 63):016x}-{index:08x}-seed',
+            'date': local.date(), 'time': local.time(), 'time_zone_offset': format_offset(int(offsets[index])),
+            'coordinates': f'{latitude},{longitude}', 'notes': None, 'device_id': f'station-{int(stations[index]):03d}',
+            'idempotency_key': None, 'created': now, 'updated': now, 'deleted': None,
+            'observed_at_utc': observed_at, 'latitude': latitude, 'longitude': longitude,
+            'grid_cell': grid_cell(latitude, longitude),
+        }
+        for name, values in readings.items():
+            row[name] = values[index]
+        rows.append(row)
+    return rows
+
+
+# The app under test, built once the database is chosen
+_app = None
+
+
+def bench_app():
+    global _app
+    if _app is None:
+        from app import create_app
+        _app = create_app()
+    return _app
+
+
+# Bulk insert the rows in chunks straight into the table (no rollup upserts; see --rollups)
+def seed(rows, with_rollups, seed_value):
+    import models
+    from devices import register_devices, upsert_latest
+    from rollups import rebuild_rollups
+    from sqlalchemy import insert
+
+    rng = np.random.default_rng(seed_value)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    with bench_app().app_context():
+        db = models.db
+        db.create_all()
+        models.migrate_derived_columns()
+        # No fsyncs while seeding a throwaway database; outside a transaction, on the writer's only connection
+        connection = db.engine.raw_connection()
+        connection.driver_connection.execute('PRAGMA synchronous=OFF')
+        connection.close()
+        register_devices(db.session.connection(), models.Device.__table__,
+                         [f'station-{station:03d}' for station in range(STATIONS)], now)
+        inserted = 0
+        while inserted < rows:
+            chunk = synthetic_rows(rng, min(SEED_CHUNK_SIZE, rows - inserted), now)
+            db.session.execute(insert(models.Observation), chunk)
+            upsert_latest(db.session.connection(), models.DeviceLatest.__table__, chunk)
+            db.session.commit()
+            inserted += len(chunk)
+            print(f"seeded {inserted}/{rows}", file=sys.stderr, end='\r')
+        print(file=sys.stderr)
+        if with_rollups:
+            with db.engine.begin() as connection:
+                rebuild_rollups(connection, models.ObservationRollup.__table__, models.Observation.__table__)
+    return time.perf_counter() - started
+
+
+# Ids and cursors of random seeded rows, for the read, update and delete requests
+def sample_targets(path, count, seed_value):
+    from routes import DATE_TIME_KEY, encode_cursor
+
+    connection = sqlite3.connect(path)
+    total = connection.execute('SELECT max(rowid) FROM observation').fetchone()[0] or 0
+    rng = random.Random(seed_value)
+    rowids = sorted({rng.randint(1, total) for _ in range(count * 4)}) if total else []
+    rows = []
+    for start in range(0, len(rowids), 500):
+        chunk = rowids[start:start + 500]
+        rows += connection.execute(
+            f"SELECT id, date, time, observed_at_utc FROM observation WHERE deleted IS NULL AND rowid IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+    connection.close()
+    rng.shuffle(rows)
+
+    key = DATE_TIME_KEY
+    targets = []
+    for observation_id, day, moment, observed_at in rows:
+        cursor = encode_cursor((datetime.strptime(day, '%Y-%m-%d').date(),
+                                datetime.strptime(moment[:8], '%H:%M:%S').time(), observation_id), key)
+        targets.append({'id': observation_id, 'cursor': cursor, 'observed_at': observed_at[:19].replace(' ', 'T')})
+    return targets
+
+
+def observation_body(rng):
+    moment = SEED_START + timedelta(seconds=rng.randrange(SEED_DAYS * 86400))
+    return {
+        'date': moment.strftime('%Y-%m-%d'), 'time': moment.strftime('%H:%M:%S'), 'time_zone_offset': '+00:00',
+        'coordinates': f'{rng.uniform(35, 57):.5f},{rng.uniform(-10, 20):.5f}',
+        'temperature_water': round(rng.gauss(12, 4), 3), 'humidity': round(rng.uniform(20, 100), 3),
+        'becquerel': round(rng.gauss(0.4, 0.05), 3), 'device_id': f'station-{rng.randrange(STATIONS):03d}',
+    }
+
+
+# Every request of one operation as (method, path, JSON body or None); deletes and updates use distinct rows
+def plan_requests(operation, count, targets, rng):
+    if operation == 'create':
+        return [('POST', '/observations', observation_body(rng)) for _ in range(count)]
+    if operation == 'batch':
+        return [('POST', '/observations/batch', [observation_body(rng) for _ in range(BATCH_SIZE)]) for _ in range(count)]
+    if operation == 'list':
+        return [('GET', f"/observations?limit={PAGE_SIZE}&after={rng.choice(targets)['cursor']}", None) for _ in range(count)]
+    if operation == 'get':
+        return [('GET', f"/observations/{rng.choice(targets)['id']}", None) for _ in range(count)]
+    if operation == 'range':
+        plans = []
+        for _ in range(count):
+            start = datetime.fromisoformat(rng.choice(targets)['observed_at'])
+            end = start + timedelta(hours=6)
+            plans.append(('GET', f"/observations/range?start={start.isoformat()}Z&end={end.isoformat()}Z&limit={PAGE_SIZE}", None))
+        return plans
+    if operation == 'update':
+        return [('PUT', f"/observations/{target['id']}", {'becquerel': round(rng.gauss(0.4, 0.05), 3)})
+                for target in targets[:count]]
+    return [('DELETE', f"/observations/{target['id']}", None) for target in targets[-count:]]
+
+
+def summarize(latencies, errors, elapsed):
+    values = np.array(latencies) * 1000
+    done = len(latencies)
+    return {
+        'requests': done,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(done / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(float(values.mean()), 3) if done else None,
+            'p50': round(float(np.percentile(values, 50)), 3) if done else None,
+            'p95': round(float(np.percentile(values, 95)), 3) if done else None,
+            'p99': round(float(np.percentile(values, 99)), 3) if done else None,
+            'max': round(float(values.max()), 3) if done else None,
+        },
+    }
+
+
+# In-process: one request at a time through the Flask test client (no network, no server)
+def run_client(plans):
+    client = bench_app().test_client()
+    results = {}
+    for operation, requests in plans.items():
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for method, path, body in requests:
+            sent = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            latencies.append(time.perf_counter() - sent)
+            errors += response.status_code >= 400
+        results[operation] = summarize(latencies, errors, time.perf_counter() - started)
+        print(f"client {operation}: {results[operation]['throughput_rps']} req/s", file=sys.stderr)
+    return results
+
+
+# Over HTTP: `concurrency` threads with their own keep-alive connection share the requests
+def run_server(plans, port, concurrency):
+    results = {}
+    for operation, requests in plans.items():
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        queue = list(reversed(requests))
+
+        def worker():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            while True:
+                with lock:
+                    if not queue:
+                        break
+                    method, path, body = queue.pop()
+                payload = json.dumps(body) if body is not None else None
+                headers = {'Content-Type': 'application/json'} if body is not None else {}
+                sent = time.perf_counter()
+                try:
+                    connection.request(method, path, body=payload, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    failed = True
+                elapsed = time.perf_counter() - sent
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += failed
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[operation] = summarize(latencies, errors[0], time.perf_counter() - started)
+        print(f"server {operation}: {results[operation]['throughput_rps']} req/s", file=sys.stderr)
+    return results
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+# gunicorn if it is installed, otherwise pre-forked werkzeug workers sharing one listening socket
+def start_server(port, workers):
+    if shutil.which('gunicorn'):
+        command = ['gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app']
+        server = 'gunicorn'
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', str(port), '--workers', str(workers)]
+        server = 'werkzeug-prefork'
+    process = subprocess.Popen(command, cwd=ROOT, env=os.environ.copy(), start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return process, server
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    process.wait(timeout=30)
+
+
+def serve(port, workers):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from wsgi import app
+
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'  # Keep-alive, like a real deployment
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No access log line per request
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            make_server('127.0.0.1', port, app, threaded=True, fd=listener.fileno()).serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for child in children:
+            os.kill(child, signal.SIGTERM)
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, stop)
+    for child in children:
+        os.waitpid(child, 0)
+
+
+def main():
+    args = parse_args()
+    if args.serve:
+        serve(args.serve, args.workers)
+        return
+
+    directory = None
+    path = args.database
+    if path is None:
+        directory = tempfile.mkdtemp(prefix='cleansmrs-bench-')
+        path = os.path.join(directory, 'bench.db')
+    use_database(path)
+
+    existing = count_rows(path)
+    seed_seconds = None
+    if not (args.reuse and existing >= args.rows):
+        if existing:
+            os.remove(path)
+        seed_seconds = seed(args.rows, args.rollups, args.seed)
+
+    drivers = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    # Deletes and updates need distinct rows per driver
+    targets = sample_targets(path, args.requests * 2 * len(drivers), args.seed)
+    report = {
+        'rows': count_rows(path),
+        'seed_seconds': round(seed_seconds, 1) if seed_seconds is not None else None,
+        'requests_per_operation': args.requests,
+        'batch_size': BATCH_SIZE,
+        'page_size': PAGE_SIZE,
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+    }
+
+    rng = random.Random(args.seed)
+    for index, driver in enumerate(drivers):
+        share = targets[index::len(drivers)]
+        plans = {operation: plan_requests(operation, args.requests, share, rng) for operation in OPERATIONS}
+        if driver == 'client':
+            report['client'] = {'driver': 'flask-test-client', 'concurrency': 1, 'results': run_client(plans)}
+        else:
+            port = free_port()
+            process, server = start_server(port, args.workers)
+            try:
+                report['server'] = {
+                    'driver': server, 'workers': args.workers, 'concurrency': args.concurrency,
+                    'results': run_server(plans, port, args.concurrency),
+                }
+            finally:
+                stop_server(process)
+
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# Compare payload size and decode cost of a JSON batch against the same readings as binary records.
+# Run from the repository root: python benchmarks/binary_bench.py [records]
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binary
+from models import derived_columns
+from routes import parse_observation
+
+
+def readings(count):
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        yield start + timedelta(minutes=i), {
+            "temperature_water": 12.5, "temperature_air": 15.25, "humidity": 80.0, "wind_speed": 3.2,
+            "wind_direction": 270.0, "precipitation": 0.0, "haze": 0.1, "becquerel": 0.42,
+        }
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {elapsed * 1000:9.1f} ms")
+    return elapsed
+
+
+def decode_json(body):
+    for item in json.loads(body):
+        row = parse_observation(item)
+        row.update(derived_columns(row['date'], row['time'], row['time_zone_offset'], row['coordinates']))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    items = []
+    records = []
+    for moment, values in readings(count):
+        local = moment + timedelta(hours=1)
+        items.append(dict(values, date=local.strftime('%Y-%m-%d'), time=local.strftime('%H:%M:%S'),
+                          time_zone_offset="+01:00", coordinates="51.50735,-0.12776"))
+        records.append(binary.encode_record(moment, 60, 51.50735, -0.12776, **values))
+    json_body = json.dumps(items).encode()
+    binary_body = b''.join(records)
+
+    print(f"{count} records")
+    print(f"{'JSON bytes':<30} {len(json_body):9d} ({len(json_body) / count:.0f} per record)")
+    print(f"{'binary bytes':<30} {len(binary_body):9d} ({binary.RECORD.size} per record)")
+    print(f"size ratio: {len(json_body) / len(binary_body):.1f}x smaller")
+    # One warm-up pass each, so imports (NumPy for the binary path) and caches aren't timed
+    decode_json(json_body)
+    binary.decode_records(binary_body)
+    json_time = timed("JSON decode + validate", lambda: decode_json(json_body))
+    binary_time = timed("binary decode", lambda: binary.decode_records(binary_body))
+    print(f"decode speedup: {json_time / binary_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
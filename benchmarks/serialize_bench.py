@@ -0,0 +1,94 @@
+# Compare the old per-endpoint dict builder over ORM objects with the tuple select + compiled serializer.
+# Run from the repository root: python benchmarks/serialize_bench.py [rows]
+import os
+import sys
+import time
+from datetime import date, datetime, time as time_of_day
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from models import Observation
+from serializers import observation_columns, serialize_rows
+
+
+# The dict every list endpoint used to build by hand for each row
+def old_serialize(observation):
+    return {
+        "id": observation.id,
+        "date": observation.date.strftime('%Y-%m-%d'),
+        "time": observation.time.strftime('%H:%M:%S'),
+        "time_zone_offset": observation.time_zone_offset,
+        "coordinates": observation.coordinates,
+        "temperature_water": observation.temperature_water,
+        "temperature_air": observation.temperature_air,
+        "humidity": observation.humidity,
+        "wind_speed": observation.wind_speed,
+        "wind_direction": observation.wind_direction,
+        "precipitation": observation.precipitation,
+        "haze": observation.haze,
+        "becquerel": observation.becquerel,
+        "notes": observation.notes,
+        "created": observation.created.strftime('%Y-%m-%d %H:%M:%S'),
+        "updated": observation.updated.strftime('%Y-%m-%d %H:%M:%S') if observation.updated else None,
+        "deleted": observation.deleted.strftime('%Y-%m-%d %H:%M:%S') if observation.deleted else None
+    }
+
+
+def seed(engine, count):
+    Observation.metadata.create_all(engine)
+    now = datetime.utcnow()
+    rows = [{
+        "id": f"{i:036d}",
+        "date": date(2024, 1 + i % 12, 1 + i % 28),
+        "time": time_of_day(i % 24, i % 60, i % 60),
+        "time_zone_offset": "+00:00",
+        "coordinates": "51.5,-0.1",
+        "temperature_water": 12.5,
+        "temperature_air": 15.0,
+        "humidity": 80.0,
+        "wind_speed": 3.2,
+        "wind_direction": 270.0,
+        "precipitation": 0.0,
+        "haze": 0.1,
+        "becquerel": 0.4,
+        "notes": "routine reading",
+        "created": now,
+        "updated": now,
+    } for i in range(count)]
+    with engine.begin() as connection:
+        connection.execute(insert(Observation.__table__), rows)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms")
+    return elapsed, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    engine = create_engine('sqlite://')
+    seed(engine, count)
+    print(f"{count} rows")
+
+    with Session(engine) as session:
+        old, _ = timed("ORM entities + strftime dicts", lambda: [old_serialize(o) for o in session.query(Observation).all()])
+    with Session(engine) as session:
+        new, _ = timed("column tuples + compiled serializer", lambda: serialize_rows(
+            session.execute(select(*observation_columns(Observation))).all()))
+    with Session(engine) as session:
+        fields = ['date', 'time', 'becquerel']
+        projected, _ = timed("?fields=date,time,becquerel", lambda: serialize_rows(
+            session.execute(select(*observation_columns(Observation, fields))).all(), fields))
+
+    print(f"speedup (all fields): {old / new:.1f}x")
+    print(f"speedup (projection): {old / projected:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Time /observations/stats over a large window of readings: the column load from SQLite that feeds it and
+# its computations. Defaults to STATS_MAX_ROWS readings, the most the endpoint accepts.
+# Run from the repository root: python benchmarks/stats_bench.py [rows]
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats
+from config import Config
+
+
+def readings(count):
+    rng = np.random.default_rng(1)
+    times = 1704067200.0 + np.sort(rng.uniform(0, 30 * 86400, count))
+    becquerel = rng.normal(0.4, 0.05, count)
+    becquerel[rng.choice(count, 20, replace=False)] += 1.0  # Spikes to find
+    humidity = rng.uniform(40, 90, count)
+    humidity[rng.random(count) < 0.1] = np.nan
+    return times, {"becquerel": becquerel, "humidity": humidity}
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {elapsed * 1000:9.1f} ms")
+    return result, elapsed
+
+
+# The same load routes.load_metric_arrays does: count the rows, then fetch them in chunks into one
+# preallocated float ndarray. Returns the seconds it took (building the database isn't timed).
+def load_from_sqlite(times, columns):
+    path = os.path.join(tempfile.mkdtemp(), 'stats.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE observation (observed_at_utc DATETIME, becquerel FLOAT, humidity FLOAT)")
+    moments = np.datetime_as_string((times * 1e6).astype('int64').astype('datetime64[us]'), unit='us')
+    connection.executemany("INSERT INTO observation VALUES (?, ?, ?)", zip(
+        [moment.replace('T', ' ') for moment in moments],
+        columns["becquerel"].tolist(),
+        [None if np.isnan(value) else value for value in columns["humidity"].tolist()],
+    ))
+    connection.commit()
+
+    def fetch():
+        count = connection.execute("SELECT count(*) FROM observation").fetchone()[0]
+        cursor = connection.execute(
+            "SELECT (julianday(observed_at_utc) - 2440587.5) * 86400.0, becquerel, humidity "
+            "FROM observation ORDER BY observed_at_utc"
+        )
+        return stats.fetch_array(cursor, count, 3)
+
+    _, elapsed = timed("SQLite count + chunked fetch", fetch)
+    connection.close()
+    os.remove(path)
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else Config.STATS_MAX_ROWS
+    times, columns = readings(count)
+    window = stats.parse_window('1h')
+    print(f"{count} readings, 2 metrics, 1h window")
+
+    load = load_from_sqlite(times, columns)
+
+    starts, _ = timed("window starts (shared)", lambda: stats.window_starts(times, window))
+    for name, values in columns.items():
+        timed(f"{name} percentiles", lambda: stats.summarize(values, stats.DEFAULT_PERCENTILES))
+        prefix, _ = timed(f"{name} prefix sums", lambda: stats.prefix_sums(values))
+        timed(f"{name} z-score anomalies", lambda: stats.find_anomalies(times, values, prefix, starts, 3.0))
+    timed("correlations", lambda: stats.correlations(columns))
+    body, compute = timed("compute_stats", lambda: stats.compute_stats(
+        times, columns, stats.DEFAULT_PERCENTILES, window, 3.0, stats.DEFAULT_POINTS
+    ))
+    print(f"becquerel anomalies found: {body['metrics']['becquerel']['anomaly_count']}")
+    print(f"whole response: {(load + compute) * 1000:.0f} ms for {count} readings "
+          f"(load {load * 1000:.0f} ms + compute {compute * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# Per-record cost of validating JSON observations: the marshmallow ObservationSchema that used to live in
+# observations/schemas.py (with its field names fixed to match the model and the same range checks), the old
+# hand-written strptime checks and the compiled validator routes.py uses now.
+# Run from the repository root: python benchmarks/validate_bench.py [records]
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from marshmallow import Schema, fields, validate
+
+from routes import OBSERVATION_FIELDS, REQUIRED_FIELDS, check_key, parse_observation
+from timestamps import parse_utc_offset
+
+
+class ObservationSchema(Schema):
+    id = fields.Str(validate=validate.Length(1, 36))
+    idempotency_key = fields.Str(validate=validate.Length(1, 64))
+    date = fields.Date(required=True)
+    time = fields.Time(required=True)
+    time_zone_offset = fields.Str(required=True, validate=parse_utc_offset)
+    coordinates = fields.Str(required=True, validate=validate.Length(1, 50))
+    temperature_water = fields.Float(allow_none=True)
+    temperature_air = fields.Float(allow_none=True)
+    humidity = fields.Float(allow_none=True, validate=validate.Range(0, 100))
+    wind_speed = fields.Float(allow_none=True, validate=validate.Range(0))
+    wind_direction = fields.Float(allow_none=True, validate=validate.Range(0, 360))
+    precipitation = fields.Float(allow_none=True, validate=validate.Range(0))
+    haze = fields.Float(allow_none=True, validate=validate.Range(0))
+    becquerel = fields.Float(allow_none=True, validate=validate.Range(0))
+    notes = fields.Str(allow_none=True)
+    device_id = fields.Str(allow_none=True, validate=validate.Length(1, 64))
+
+
+# The checks parse_observation used to make by hand (no type or range checks on the readings)
+def old_parse_observation(data):
+    if not isinstance(data, dict):
+        raise ValueError("Observation must be a JSON object")
+    for field in REQUIRED_FIELDS:
+        if data.get(field) is None:
+            raise ValueError(f"'{field}' is required.")
+    row = {field: data.get(field) for field in OBSERVATION_FIELDS}
+    row['date'] = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    row['time'] = datetime.strptime(data['time'], '%H:%M:%S').time()
+    parse_utc_offset(row['time_zone_offset'])
+    if row['device_id'] is not None:
+        check_key(row['device_id'], 64, 'device_id')
+    key = data.get('idempotency_key') or data.get('id')
+    row['idempotency_key'] = check_key(key, 64, 'idempotency_key') if key is not None else None
+    return row
+
+
+def records(count):
+    return [{
+        "date": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}",
+        "time": f"{i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}",
+        "time_zone_offset": "+01:00",
+        "coordinates": "51.5074,-0.1278",
+        "temperature_water": 12.5,
+        "temperature_air": 15.0,
+        "humidity": 80.0,
+        "wind_speed": 3.2,
+        "wind_direction": 270.0,
+        "precipitation": 0.0,
+        "haze": 0.1,
+        "becquerel": 0.4,
+        "notes": "routine reading",
+        "device_id": "station-004",
+        "idempotency_key": f"station-004-{i}",
+    } for i in range(count)]
+
+
+def timed(label, func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:9.1f} ms  {elapsed / len(items) * 1e6:6.2f} us/record")
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    items = records(count)
+    schema = ObservationSchema()
+    print(f"{count} records")
+
+    marshmallow = timed("marshmallow schema", schema.load, items)
+    old = timed("hand-written strptime checks", old_parse_observation, items)
+    new = timed("compiled validator", parse_observation, items)
+
+    print(f"compiled / marshmallow: {new / marshmallow:.1%}")
+    print(f"compiled / hand-written: {new / old:.1%}")
+
+
+if __name__ == '__main__':
+    main()
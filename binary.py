@@ -0,0 +1,103 @@
+# Compact fixed-size binary records for low-power devices, sent with Content-Type: application/vnd.cleansmrs.observation
+#
+# Every record is 46 bytes, little-endian, no padding:
+#   uint32   observed_at   seconds since 1970-01-01 UTC
+#   int16    utc_offset    minutes east of UTC the device's clock was set to
+#   float32  latitude
+#   float32  longitude
+#   float32  temperature_water, temperature_air, humidity, wind_speed,
+#            wind_direction, precipitation, haze, becquerel   (NaN = not measured)
+#
+# A batch is just records back to back. The same reading as JSON is around 300 bytes.
+from datetime import datetime
+import itertools
+import math
+import struct
+
+from geo import CELL_DEGREES, GRID_COLUMNS
+from serializers import METRIC_COLUMNS
+
+MIMETYPE = 'application/vnd.cleansmrs.observation'
+RECORD = struct.Struct('<Ihff' + 'f' * len(METRIC_COLUMNS))
+EPOCH = datetime(1970, 1, 1)
+
+
+def format_offset(minutes):
+    sign = '-' if minutes < 0 else '+'
+    hours, minutes = divmod(abs(minutes), 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+# The same layout as a NumPy structured dtype, so a whole body is unpacked with one np.frombuffer call
+RECORD_FIELDS = [('observed_at', '<u4'), ('utc_offset', '<i2'), ('latitude', '<f4'), ('longitude', '<f4')] + \
+    [(metric, '<f4') for metric in METRIC_COLUMNS]
+
+
+# float32 readings back to the precision the device sent (7 significant digits), as float64.
+# Each value is scaled by a power of ten, rounded to an integer and scaled back, all as whole-array operations.
+def _readings(np, values):
+    values = values.astype('float64')
+    magnitudes = np.abs(values)
+    exponents = np.zeros(len(values))
+    scaled = np.isfinite(values) & (magnitudes > 0)
+    exponents[scaled] = 6 - np.floor(np.log10(magnitudes[scaled]))
+    scales = 10.0 ** np.abs(exponents)
+    up = exponents >= 0
+    return np.where(up, np.round(np.where(up, values * scales, values / scales)) / scales,
+                    np.round(values / scales) * scales)
+
+
+# A column as a list of Python floats with None for NaN
+def _column(np, values):
+    column = values.astype(object)
+    column[np.isnan(values)] = None
+    return column.tolist()
+
+
+# Decode a body of records into row dicts ready for insert. The body is unpacked, range-checked, converted
+# and rounded column by column with NumPy; Python only builds the row dicts at the end.
+# The derived columns come straight from the record, so no date or coordinate strings are parsed.
+def decode_records(data):
+    import numpy as np  # Only loaded by workers that receive binary uploads
+
+    if not data or len(data) % RECORD.size:
+        raise ValueError(f"Binary body must be a whole number of {RECORD.size} byte records")
+
+    records = np.frombuffer(data, dtype=np.dtype(RECORD_FIELDS))
+    latitudes = records['latitude'].astype('float64')
+    longitudes = records['longitude'].astype('float64')
+    invalid = ~((latitudes >= -90) & (latitudes <= 90) & (longitudes >= -180) & (longitudes <= 180))
+    if invalid.any():
+        raise ValueError(f"Coordinates out of range in record {int(np.flatnonzero(invalid)[0])}")
+    latitudes, longitudes = np.round(latitudes, 5), np.round(longitudes, 5)
+    rows_of_cells = np.minimum(np.floor((latitudes + 90) / CELL_DEGREES).astype('int64'), int(180 / CELL_DEGREES) - 1)
+    columns_of_cells = np.minimum(np.floor((longitudes + 180) / CELL_DEGREES).astype('int64'), GRID_COLUMNS - 1)
+
+    observed = records['observed_at'].astype('datetime64[s]')
+    offsets = records['utc_offset'].astype('int64')
+    local = (observed + offsets.astype('timedelta64[m]')).astype('datetime64[us]')
+    offset_names = {minutes: format_offset(minutes) for minutes in np.unique(offsets).tolist()}
+
+    columns = {
+        'date': local.astype('datetime64[D]').tolist(),
+        'time': [moment.time() for moment in local.tolist()],
+        'time_zone_offset': [offset_names[minutes] for minutes in offsets.tolist()],
+        'coordinates': [f"{latitude},{longitude}" for latitude, longitude in zip(latitudes.tolist(), longitudes.tolist())],
+        'observed_at_utc': observed.astype('datetime64[us]').tolist(),
+        'latitude': latitudes.tolist(),
+        'longitude': longitudes.tolist(),
+        'grid_cell': (rows_of_cells * GRID_COLUMNS + columns_of_cells).tolist(),
+    }
+    for metric in METRIC_COLUMNS:
+        columns[metric] = _column(np, _readings(np, records[metric]))
+    names = list(columns) + ['notes']
+    return [dict(zip(names, values)) for values in zip(*columns.values(), itertools.repeat(None))]
+
+
+# Pack one reading; used by device firmware tests and the benchmarks
+def encode_record(observed_at_utc, utc_offset_minutes, latitude, longitude, **readings):
+    values = [readings.get(metric) for metric in METRIC_COLUMNS]
+    return RECORD.pack(
+        int((observed_at_utc - EPOCH).total_seconds()), utc_offset_minutes, latitude, longitude,
+        *[math.nan if value is None else value for value in values]
+    )
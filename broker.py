@@ -0,0 +1,61 @@
+from threading import Condition
+
+
+# In-process fan-out of published events to any number of subscribers.
+# Events go into one shared buffer in publish order; a subscriber is just a position in it, so publishing
+# costs the same however many subscribers there are and every event is built once for all of them.
+# The newest `backlog` events are kept; a subscriber that falls further behind than that is told it missed some.
+class Broker:
+    def __init__(self, backlog=10000):
+        self.backlog = backlog
+        self._condition = Condition()
+        self._events = []
+        self._first = 1  # Position of _events[0]; positions count up from 1 for the first event ever published
+        self.published = 0
+        self.subscribers = 0
+
+    # Position of the newest event (0 before anything is published)
+    @property
+    def position(self):
+        return self._first + len(self._events) - 1
+
+    def publish(self, events):
+        if not events:
+            return
+        with self._condition:
+            self._events.extend(events)
+            self.published += len(events)
+            # Trimmed in steps of half the backlog so the copy is amortised over many publishes
+            if len(self._events) > self.backlog * 3 // 2:
+                dropped = len(self._events) - self.backlog
+                del self._events[:dropped]
+                self._first += dropped
+            self._condition.notify_all()
+
+    # Start receiving events; returns the position to wait from
+    def subscribe(self):
+        with self._condition:
+            self.subscribers += 1
+            return self.position
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
+
+    # The events published after `position`, waiting up to `timeout` seconds for the first one.
+    # Returns (events, new position, whether events after `position` were already dropped).
+    def wait(self, position, timeout):
+        with self._condition:
+            if position >= self.position:
+                self._condition.wait(timeout)
+            missed = position + 1 < self._first
+            events = self._events[max(position + 1 - self._first, 0):]
+            return events, self.position, missed
+
+    def stats(self):
+        return {
+            "subscribers": self.subscribers,
+            "published": self.published,
+            "buffered": len(self._events),
+            "backlog": self.backlog,
+        }
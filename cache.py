@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+# Bounded in-process LRU cache whose entries also expire after ttl seconds
+class LRUCache:
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0  # Entries pushed out by max_size, counted under the lock
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared backend so every worker sees the same entries and invalidations (needs the redis package)
+class RedisCache:
+    def __init__(self, url, ttl=60, prefix='cleansmrs:'):
+        import redis  # Only needed when a shared cache is configured
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+# Read-through cache of serialized response bodies with hit/miss counters.
+# Request threads share it, so the counters are only changed under a lock (+= is not atomic).
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = Lock()
+
+    # Cached bytes for key, or load() them, store them and return them; load() may return None for "not found"
+    def get_or_load(self, key, load):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if value is not None:
+            return value
+        value = load()
+        if value is not None:
+            self.backend.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self.invalidations += 1
+        self.backend.delete(key)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "hits": hits,
+            "misses": misses,
+            "invalidations": invalidations,
+            "evictions": getattr(self.backend, 'evictions', None),  # Redis evicts on its own
+            "hit_ratio": hits / lookups if lookups else None,
+        }
+
+
+def create_cache(config):
+    ttl = config.get('OBSERVATION_CACHE_TTL', 60)
+    if config.get('OBSERVATION_CACHE_REDIS_URL'):
+        return ResponseCache(RedisCache(config['OBSERVATION_CACHE_REDIS_URL'], ttl=ttl))
+    return ResponseCache(LRUCache(max_size=config.get('OBSERVATION_CACHE_SIZE', 1024), ttl=ttl))
@@ -1,6 +1,38 @@
+import os
+
+# Defaults for create_app(); pass a dict to create_app() to override any of them
 class Config:
     # Secret key for signing JWT tokens
-    SECRET_KEY = 'your-secret-key'  # Change to your actual secret key
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')  # Change to your actual secret key
 
     # JWT token location (where to look for the token)
     JWT_TOKEN_LOCATION = ['headers']  # You can also use 'cookies' if needed
+    JWT_REQUIRED = False  # Require a JWT on every API endpoint; flask_jwt_extended is only imported when this is on
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///cleansmrs.db')  # Unified database
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')  # e.g. a Postgres replica; default: the same database
+    READ_POOL_SIZE = 8  # Read-only connections per worker (storage.py); writes share one connection on SQLite
+    WRITE_POOL_TIMEOUT = 30  # Seconds a write waits for the worker's SQLite writer connection
+    SQLITE_BUSY_TIMEOUT = 10000  # Milliseconds a connection waits for another worker's lock before failing
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the database file read through mmap
+    SQLITE_CACHE_SIZE = 64 * 1024 * 1024  # Bytes of page cache per connection
+    OBSERVATION_CACHE_SIZE = 1024  # Single observations kept in memory per worker
+    OBSERVATION_CACHE_TTL = 60  # Seconds; also how long an in-process cache can serve a version another worker has changed
+    OBSERVATION_CACHE_REDIS_URL = None  # e.g. redis://localhost:6379/0 to share the cache between workers
+    ASYNC_INGEST = False  # Queue POST /observations and commit in the background (responds 202)
+    INGEST_QUEUE_SIZE = 10000  # Queued observations before POST answers 429
+    INGEST_BATCH_SIZE = 500  # Most observations per background commit
+    INGEST_FLUSH_INTERVAL = 0.5  # Longest a queued observation waits for its batch, in seconds
+    SEEN_KEYS_SIZE = 100000  # Idempotency keys remembered in memory per worker
+    SEEN_KEYS_TTL = 600  # Seconds; older retries are still caught by the unique index
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')  # Cold tier: per-month NumPy column files (default: instance/archive)
+    ARCHIVE_AFTER_DAYS = 365  # `flask archive` moves whole months older than this out of the database
+    SLOW_QUERY_SECONDS = 0.1  # SQL statements slower than this are counted and logged
+    PROFILE_REQUESTS = False  # Let clients send X-Profile: 1 to get a cProfile summary header back
+    STATS_MAX_ROWS = 200000  # Most readings /observations/stats loads; fetching costs about 2.5 us per live row on SQLite
+    QUERY_EXPLAIN = False  # Let list requests send ?explain=1 for the query plan (always on in debug mode)
+    STREAM_BACKLOG = 10000  # Newest events kept per worker for /observations/stream subscribers that fall behind
+    STREAM_KEEPALIVE = 15  # Seconds between keep-alive comments on an idle stream
+    STREAM_REPLAY_LIMIT = 10000  # Most observations replayed from the database when a stream resumes
+    CHANGE_FEED_DELAY = 0  # Seconds of newest changes the change feed holds back; 0 is safe on SQLite, whose lock orders every write
@@ -0,0 +1,58 @@
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def _dialect(connection):
+    return postgresql if connection.dialect.name == 'postgresql' else sqlite
+
+
+# Make sure every device id seen on ingest has a registry row, so stations register themselves
+def register_devices(connection, device_table, device_ids, now):
+    device_ids = sorted(set(device_id for device_id in device_ids if device_id))
+    if not device_ids:
+        return
+    statement = _dialect(connection).insert(device_table).on_conflict_do_nothing(index_elements=['id'])
+    connection.execute(statement, [{'id': device_id, 'created': now} for device_id in device_ids])
+
+
+# Point each device's latest row at the newest of the new observations, unless it already has a newer one.
+# Each observation is a mapping with id, device_id and observed_at_utc.
+def upsert_latest(connection, latest_table, observations):
+    newest = {}
+    for observation in observations:
+        device_id, moment = observation['device_id'], observation['observed_at_utc']
+        if not device_id or moment is None:
+            continue
+        if device_id not in newest or moment > newest[device_id]['observed_at_utc']:
+            newest[device_id] = {'device_id': device_id, 'observation_id': observation['id'], 'observed_at_utc': moment}
+    if not newest:
+        return
+
+    statement = _dialect(connection).insert(latest_table)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['device_id'],
+        set_={'observation_id': excluded['observation_id'], 'observed_at_utc': excluded['observed_at_utc']},
+        where=latest_table.c.observed_at_utc < excluded['observed_at_utc']
+    )
+    connection.execute(statement, list(newest.values()))
+
+
+# Recompute one device's latest row from the (device_id, observed_at_utc) index, after its
+# latest observation was changed or deleted
+def refresh_latest(connection, latest_table, observation_table, device_id):
+    newest = connection.execute(
+        select(observation_table.c.id, observation_table.c.observed_at_utc)
+        .where(
+            observation_table.c.device_id == device_id,
+            observation_table.c.observed_at_utc.isnot(None),
+            observation_table.c.deleted.is_(None)
+        )
+        .order_by(observation_table.c.observed_at_utc.desc())
+        .limit(1)
+    ).first()
+    connection.execute(delete(latest_table).where(latest_table.c.device_id == device_id))
+    if newest is not None:
+        connection.execute(latest_table.insert().values(
+            device_id=device_id, observation_id=newest.id, observed_at_utc=newest.observed_at_utc
+        ))
@@ -0,0 +1,87 @@
+from math import asin, cos, floor, radians, sin, sqrt
+import re
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# The globe is cut into CELL_DEGREES x CELL_DEGREES cells numbered row by row from (-90, -180);
+# grid_cell is indexed so a bounding box turns into a handful of index range scans
+CELL_DEGREES = 0.5
+GRID_COLUMNS = int(360 / CELL_DEGREES)
+# Past this many grid rows a bbox just filters on the latitude/longitude columns instead
+MAX_GRID_ROWS = 64
+
+COORDINATE_SPLIT = re.compile(r'[,;\s]+')
+
+
+# "51.5,-0.1", "51.5, -0.1" or "51.5 -0.1" -> (51.5, -0.1); raises ValueError for anything else
+def parse_coordinates(value):
+    parts = [part for part in COORDINATE_SPLIT.split(str(value).strip()) if part]
+    if len(parts) != 2:
+        raise ValueError(f"Invalid coordinates: {value}")
+    latitude, longitude = float(parts[0]), float(parts[1])
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError(f"Coordinates out of range: {value}")
+    return latitude, longitude
+
+
+def grid_row(latitude):
+    return min(int(floor((latitude + 90) / CELL_DEGREES)), int(180 / CELL_DEGREES) - 1)
+
+
+def grid_column(longitude):
+    return min(int(floor((longitude + 180) / CELL_DEGREES)), GRID_COLUMNS - 1)
+
+
+def grid_cell(latitude, longitude):
+    return grid_row(latitude) * GRID_COLUMNS + grid_column(longitude)
+
+
+# latitude, longitude and grid_cell for a coordinates string, all None if it can't be parsed
+def coordinate_columns(coordinates):
+    try:
+        latitude, longitude = parse_coordinates(coordinates)
+    except (TypeError, ValueError):
+        return {'latitude': None, 'longitude': None, 'grid_cell': None}
+    return {'latitude': latitude, 'longitude': longitude, 'grid_cell': grid_cell(latitude, longitude)}
+
+
+# "?bbox=min_lon,min_lat,max_lon,max_lat" -> (min_lat, min_lon, max_lat, max_lon)
+def parse_bbox(value):
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(part) for part in value.split(',')]
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("bbox minimums must not be greater than its maximums")
+    return max(min_lat, -90.0), max(min_lon, -180.0), min(max_lat, 90.0), min(max_lon, 180.0)
+
+
+# Bounding box that contains every point within radius_km of (latitude, longitude), clamped to the map
+def bbox_around(latitude, longitude, radius_km):
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(cos(radians(latitude)), 1e-6))
+    return (
+        max(latitude - lat_delta, -90.0), max(longitude - lon_delta, -180.0),
+        min(latitude + lat_delta, 90.0), min(longitude + lon_delta, 180.0)
+    )
+
+
+# The grid_cell ranges (one per grid row) covering a bounding box, or None if there are too many
+def cell_ranges(min_lat, min_lon, max_lat, max_lon):
+    first_row, last_row = grid_row(min_lat), grid_row(max_lat)
+    if last_row - first_row + 1 > MAX_GRID_ROWS:
+        return None
+    first_column, last_column = grid_column(min_lon), grid_column(max_lon)
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
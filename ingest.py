@@ -0,0 +1,133 @@
+from collections import deque
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+# Bounded in-memory queue drained by one background thread that writes rows in batches.
+# write_batch(rows) is called with up to batch_size rows, at least every flush_interval seconds
+# while anything is waiting. A row that can't be written is passed to on_failure(row) and kept
+# in dead_letters (the newest dead_letter_size of them).
+class WriteBehindQueue:
+    def __init__(self, write_batch, max_size=10000, batch_size=500, flush_interval=0.5, on_failure=None, dead_letter_size=1000):
+        self.write_batch = write_batch
+        self.on_failure = on_failure
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue(maxsize=max_size)
+        self._thread = None
+        self._lock = Lock()
+        self._stopping = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0  # Seconds between enqueue and commit for the newest written row
+        self.max_lag = 0.0
+
+    def put(self, row):
+        self._start()
+        try:
+            self._queue.put_nowait((time.monotonic(), row))
+        except Full:
+            self.rejected += 1
+            raise QueueFull("Ingest queue is full")
+        self.enqueued += 1
+
+    # Started on first use so importing the app (or forking workers) doesn't spawn threads
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='observation-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    # Wait for the first row, then keep taking rows until the batch is full or flush_interval has passed
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        written = self._write_rows([row for _, row in batch])
+        if not written:
+            return
+        now = time.monotonic()
+        self.written += written
+        self.batches += 1
+        self.last_batch_size = written
+        self.last_lag = now - batch[-1][0]
+        self.max_lag = max(self.max_lag, now - batch[0][0])
+
+    # Write rows, splitting them in halves and retrying each half when the write fails, so a bad row
+    # costs a few extra transactions instead of taking the rest of its batch down with it.
+    # Returns how many rows were written.
+    def _write_rows(self, rows):
+        try:
+            self.write_batch(rows)
+            return len(rows)
+        except Exception:
+            if len(rows) == 1:
+                self.failed += 1
+                self.dead_letters.append(rows[0])
+                logger.exception("Failed to write queued row %r", rows[0])
+                if self.on_failure is not None:
+                    self.on_failure(rows[0])
+                return 0
+        middle = len(rows) // 2
+        return self._write_rows(rows[:middle]) + self._write_rows(rows[middle:])
+
+    # Stop taking new work and write out everything still queued
+    def close(self, timeout=30):
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        try:
+            oldest = self._queue.queue[0][0]
+        except IndexError:
+            oldest = None
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "oldest_age": time.monotonic() - oldest if oldest is not None else 0.0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "dead_letters": len(self.dead_letters),
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
@@ -0,0 +1,124 @@
+# In-process counters and histograms rendered in the Prometheus text exposition format (version 0.0.4).
+# Every worker process keeps its own numbers; scrape each worker, or sum them in Prometheus.
+from threading import Lock
+
+# Request latency and SQL time buckets in seconds, and body size buckets in bytes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.label_names, labels)} {_number(value)}' for labels, value in values]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(values[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {values[-1]}')
+        return lines
+
+
+# A value read when the metrics are scraped, e.g. a queue depth
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, description, read):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def samples(self):
+        return [f'{self.name} {_number(self.read())}']
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, description, labels=()):
+        return self._add(Counter(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, description, labels, buckets))
+
+    def gauge(self, name, description, read):
+        return self._add(Gauge(name, description, read))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.description}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines += metric.samples()
+        return '\n'.join(lines) + '\n'
@@ -1,7 +1,29 @@
-from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Engine, bindparam, func, or_, select
 from uuid import uuid4
-from app import db  # Import db from the app module
+from datetime import datetime, timedelta
+import sqlite3
+from devices import refresh_latest, register_devices, upsert_latest
+from geo import coordinate_columns, haversine_km
+from rollups import GRANULARITIES, add_to_rollups, remove_from_rollups
+from search import create_notes_index
+from serializers import METRIC_COLUMNS
+from timestamps import to_utc
 
+# The one SQLAlchemy instance; create_app() binds it to the app, which gives each process one engine and pool
+db = SQLAlchemy()
+
+# Stations and devices that send observations; unknown ids register themselves on first ingest
+class Device(db.Model):
+    id = db.Column(db.String(64), primary_key=True)
+    name = db.Column(db.String(100), nullable=True)
+    coordinates = db.Column(db.String(50), nullable=True)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Device {self.id}>"
+
+# Define the Observation model (part of cleansmrs.db)
 class Observation(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid4()))
     date = db.Column(db.Date, nullable=False)
@@ -20,6 +42,246 @@ class Observation(db.Model):
     created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted = db.Column(db.DateTime, nullable=True)
+    # date + time shifted by time_zone_offset, computed on write so range queries can use one index
+    observed_at_utc = db.Column(db.DateTime, nullable=True)
+    # coordinates parsed on write; grid_cell is the cell of the geo.py grid the point falls in
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    grid_cell = db.Column(db.Integer, nullable=True)
+    # Device-supplied dedup key (Idempotency-Key header, or the observation id the device chose)
+    idempotency_key = db.Column(db.String(64), nullable=True)
+    device_id = db.Column(db.String(64), db.ForeignKey('device.id'), nullable=True)
+
+    # Indexes backing keyset pagination, time-range scans, spatial lookups, ETag validators, the change feed
+    # and the ?device_id= / ?becquerel__gte= style filters of the list endpoints
+    __table_args__ = (
+        db.Index('ix_observation_date_time_id', 'date', 'time', 'id'),
+        db.Index('ix_observation_observed_at_utc_id', 'observed_at_utc', 'id'),
+        db.Index('ix_observation_grid_cell', 'grid_cell', 'latitude', 'longitude'),
+        db.Index('ix_observation_updated_id', 'updated', 'id'),
+        db.Index('ix_observation_idempotency_key', 'idempotency_key', unique=True),
+        db.Index('ix_observation_device_observed_at_utc', 'device_id', 'observed_at_utc'),
+        db.Index('ix_observation_device_date_time_id', 'device_id', 'date', 'time', 'id'),
+        db.Index('ix_observation_becquerel_id', 'becquerel', 'id'),
+    )
 
     def __repr__(self):
         return f"<Observation {self.id}>"
+
+# The newest live observation of every device, kept up to date on every write so reading it is one primary key lookup
+class DeviceLatest(db.Model):
+    device_id = db.Column(db.String(64), db.ForeignKey('device.id'), primary_key=True)
+    observation_id = db.Column(db.String(36), db.ForeignKey('observation.id'), nullable=False)
+    observed_at_utc = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<DeviceLatest {self.device_id} {self.observation_id}>"
+
+# Hourly and daily count/sum/min/max per metric, kept up to date in the same transaction as every write
+class ObservationRollup(db.Model):
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    metric = db.Column(db.String(30), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Float, nullable=False)
+    min = db.Column(db.Float, nullable=True)
+    max = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f"<ObservationRollup {self.granularity} {self.bucket_start} {self.metric}>"
+
+# A counter bumped whenever observations leave the table without a new `updated` (archiving moves them out),
+# so validators built from max(updated) still change. One row, created by the first bump.
+class ObservationGeneration(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<ObservationGeneration {self.generation}>"
+
+# The columns the rollups are built from, as a plain dict
+def rollup_values(observation):
+    values = {metric: getattr(observation, metric) for metric in METRIC_COLUMNS}
+    values['observed_at_utc'] = observation.observed_at_utc
+    return values
+
+# The (min, max) of a rollup bucket's archived rows, which the rollups cover as well as the live ones,
+# for recomputing a bucket's extremes; None when nothing in it is archived
+def archived_extremes(granularity, bucket, metric):
+    from routes import get_cold_archive  # routes imports this module
+    cold_archive = get_cold_archive()
+    if cold_archive is None:
+        return None
+    values = cold_archive.aggregate(granularity, [metric], bucket, bucket + GRANULARITIES[granularity], True).get(bucket, {}).get(metric)
+    return values[2:] if values and values[0] else None
+
+@db.event.listens_for(Observation, 'after_insert')
+def add_observation_to_rollups(mapper, connection, observation):
+    add_to_rollups(connection, ObservationRollup.__table__, [rollup_values(observation)])
+
+@db.event.listens_for(Observation, 'after_delete')
+def remove_observation_from_rollups(mapper, connection, observation):
+    if observation.deleted is None:
+        remove_from_rollups(connection, ObservationRollup.__table__, Observation.__table__, [rollup_values(observation)], archived_extremes)
+
+# An update takes the old values out and puts the new ones in, if any rolled-up column changed.
+# Soft-deleted observations don't count, so setting `deleted` only takes the old values out.
+@db.event.listens_for(Observation, 'after_update')
+def update_observation_rollups(mapper, connection, observation):
+    state = db.inspect(observation)
+    new_values = rollup_values(observation)
+    new_values['deleted'] = observation.deleted
+    old_values = {}
+    for name, value in new_values.items():
+        history = state.attrs[name].history
+        old_values[name] = history.deleted[0] if history.deleted else value
+    if old_values == new_values:
+        return
+    if old_values['deleted'] is None:
+        remove_from_rollups(connection, ObservationRollup.__table__, Observation.__table__, [old_values], archived_extremes)
+    if new_values['deleted'] is None:
+        add_to_rollups(connection, ObservationRollup.__table__, [new_values])
+
+# Devices the ORM writes for get registered first, so the foreign key holds
+@db.event.listens_for(Observation, 'before_insert')
+@db.event.listens_for(Observation, 'before_update')
+def register_observation_device(mapper, connection, observation):
+    if observation.device_id is not None and db.inspect(observation).attrs.device_id.history.has_changes():
+        register_devices(connection, Device.__table__, [observation.device_id], datetime.utcnow())
+
+@db.event.listens_for(Observation, 'after_insert')
+def update_device_latest(mapper, connection, observation):
+    upsert_latest(connection, DeviceLatest.__table__, [{
+        'id': observation.id, 'device_id': observation.device_id, 'observed_at_utc': observation.observed_at_utc
+    }])
+
+# Moving, re-timing or soft-deleting an observation can change which one is newest,
+# so the devices involved get their latest row recomputed from the index
+@db.event.listens_for(Observation, 'after_update')
+def refresh_device_latest(mapper, connection, observation):
+    state = db.inspect(observation)
+    device_ids = {observation.device_id}
+    changed = False
+    for name in ('device_id', 'observed_at_utc', 'deleted'):
+        history = state.attrs[name].history
+        if history.deleted and history.deleted[0] != getattr(observation, name):
+            changed = True
+            if name == 'device_id':
+                device_ids.add(history.deleted[0])
+    if changed:
+        for device_id in device_ids - {None}:
+            refresh_latest(connection, DeviceLatest.__table__, Observation.__table__, device_id)
+
+@db.event.listens_for(Observation, 'before_delete')
+def release_device_latest(mapper, connection, observation):
+    connection.execute(DeviceLatest.__table__.delete().where(DeviceLatest.observation_id == observation.id))
+
+@db.event.listens_for(Observation, 'after_delete')
+def refresh_device_latest_after_delete(mapper, connection, observation):
+    if observation.device_id is not None:
+        refresh_latest(connection, DeviceLatest.__table__, Observation.__table__, observation.device_id)
+
+# Columns computed on write from what the device sent, so they can be indexed
+DERIVED_COLUMNS = {
+    'observed_at_utc': 'DATETIME',
+    'latitude': 'FLOAT',
+    'longitude': 'FLOAT',
+    'grid_cell': 'INTEGER',
+}
+
+# observed_at_utc from date/time/time_zone_offset and latitude/longitude/grid_cell from coordinates
+def derived_columns(date, time, time_zone_offset, coordinates):
+    values = coordinate_columns(coordinates)
+    try:
+        values['observed_at_utc'] = to_utc(date, time, time_zone_offset)
+    except (TypeError, ValueError):
+        values['observed_at_utc'] = None
+    return values
+
+# The created/updated timestamp for a write, taken inside its transaction. On SQLite the transaction already
+# holds the write lock (BEGIN IMMEDIATE), and the timestamp is never earlier than or equal to one already
+# stored, so (updated, id) grows in commit order: a change feed cursor can't move past a write that commits later.
+def change_timestamp(connection, table):
+    now = datetime.utcnow()
+    latest = connection.execute(select(func.max(table.c.updated))).scalar()
+    return now if latest is None or now > latest else latest + timedelta(microseconds=1)
+
+# Bump the generation inside the transaction that removes the rows
+def bump_generation(connection):
+    table = ObservationGeneration.__table__
+    if connection.execute(table.update().values(generation=table.c.generation + 1)).rowcount == 0:
+        connection.execute(table.insert().values(id=1, generation=1))
+
+@db.event.listens_for(Observation, 'before_update')
+def stamp_observation_update(mapper, connection, observation):
+    state = db.inspect(observation)
+    if any(attribute.history.has_changes() for attribute in state.attrs):
+        observation.updated = change_timestamp(connection, Observation.__table__)
+
+# Keep the derived columns in step for every ORM insert and update
+@db.event.listens_for(Observation, 'before_insert')
+@db.event.listens_for(Observation, 'before_update')
+def set_derived_columns(mapper, connection, observation):
+    values = derived_columns(observation.date, observation.time, observation.time_zone_offset, observation.coordinates)
+    for name, value in values.items():
+        setattr(observation, name, value)
+
+# SQLite gets the distance function used by ?near= queries registered on every new connection
+@db.event.listens_for(Engine, 'connect')
+def register_sqlite_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('haversine_km', 4, haversine_km, deterministic=True)
+
+# Columns added after the first release that old databases need but that have nothing to backfill
+ADDED_COLUMNS = {
+    'idempotency_key': 'VARCHAR(64)',
+    'device_id': 'VARCHAR(64) REFERENCES device(id)',
+}
+
+# Rows are backfilled this many at a time by the migration
+BACKFILL_CHUNK_SIZE = 1000
+
+# Bring an existing cleansmrs.db up to date: add the derived columns, their indexes and the notes search index,
+# and fill them in for old rows
+def migrate_derived_columns():
+    columns = [column['name'] for column in db.inspect(db.engine).get_columns('observation')]
+    with db.engine.begin() as connection:
+        for name, column_type in list(DERIVED_COLUMNS.items()) + list(ADDED_COLUMNS.items()):
+            if name not in columns:
+                connection.execute(db.text(f'ALTER TABLE observation ADD COLUMN {name} {column_type}'))
+    for index in Observation.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    with db.engine.begin() as connection:
+        create_notes_index(connection)
+
+    table = Observation.__table__
+    missing = or_(*[table.c[name].is_(None) for name in DERIVED_COLUMNS])
+    assignments = {name: bindparam(f'new_{name}') for name in DERIVED_COLUMNS}
+    last_id = ''
+    filled = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.date, table.c.time, table.c.time_zone_offset, table.c.coordinates)
+            .where(missing, table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        # Rows whose offset or coordinates can't be parsed keep NULLs; the id seek moves past them
+        updates = []
+        for row in rows:
+            values = derived_columns(row.date, row.time, row.time_zone_offset, row.coordinates)
+            params = {f'new_{name}': value for name, value in values.items()}
+            params['row_id'] = row.id
+            updates.append(params)
+        db.session.execute(table.update().where(table.c.id == bindparam('row_id')).values(**assignments), updates)
+        db.session.commit()
+        last_id = rows[-1].id
+        filled += len(updates)
+
+    # The change feed orders by updated, so rows from before it was always set get their creation time.
+    # This goes through the session, which still holds the connection (on SQLite, the only write connection).
+    db.session.execute(table.update().where(table.c.updated.is_(None)).values(updated=table.c.created))
+    db.session.commit()
+    return filled
@@ -0,0 +1,174 @@
+# Query-string filters for the observation list endpoints, e.g.
+#
+#   ?becquerel__gte=0.5&device_id=station-004&date__between=2024-01-01,2024-01-31&sort=-becquerel
+#
+# Only allowlisted columns can be filtered. Values are coerced to the column's type before they are
+# bound, so SQLite compares floats with floats and dates with dates, without an implicit cast. The parsed
+# conditions are plain (column, op, value) tuples, so the cold archive can apply the same ones to its
+# column files.
+#
+# A page walks the index of its sort key, so only filters on that key's first column (or device_id, which
+# leads its own (device_id, date, time, id) index) narrow the walk. Any other filter, such as
+# ?becquerel__gte= under the default date sort, is checked row by row along the walk: a page reads rows
+# until it has `limit` matches, which is cheap for common values but a scan of most of the table for rare
+# ones. Sorting by the filtered column (?sort=becquerel) makes the same filter an index seek; ?explain=1
+# shows which index a query uses.
+from collections import namedtuple
+from datetime import date, datetime, time, timezone
+import math
+import operator
+
+from sqlalchemy import Date, DateTime, Float, Time, and_
+
+from serializers import METRIC_COLUMNS
+
+# Columns a list request may filter on
+FILTER_COLUMNS = ['id', 'date', 'time', 'time_zone_offset', 'device_id', 'observed_at_utc', 'created', 'updated'] + METRIC_COLUMNS
+
+# name__op -> how the op compares; a bare name means eq
+OPERATORS = ['eq', 'ne', 'lt', 'lte', 'gt', 'gte', 'between', 'in', 'isnull']
+# Most values one __in filter may list
+MAX_IN_VALUES = 100
+
+COMPARISONS = {'eq': operator.eq, 'ne': operator.ne, 'lt': operator.lt, 'lte': operator.le, 'gt': operator.gt, 'gte': operator.ge}
+
+Condition = namedtuple('Condition', 'column op value')
+
+
+def _parse_datetime(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _parse_float(value):
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+# Turns one query-string value into the column's Python type
+def coercer(column_type):
+    if isinstance(column_type, Float):
+        return _parse_float
+    if isinstance(column_type, DateTime):
+        return _parse_datetime
+    if isinstance(column_type, Date):
+        return date.fromisoformat
+    if isinstance(column_type, Time):
+        return time.fromisoformat
+    return str
+
+
+def parse_condition(table, name, op, raw):
+    if op == 'isnull':
+        if raw.lower() not in ('true', 'false', '1', '0'):
+            raise ValueError(f"{name}__isnull must be true or false")
+        return Condition(name, op, raw.lower() in ('true', '1'))
+
+    coerce = coercer(table.c[name].type)
+    try:
+        if op == 'between':
+            values = [coerce(part.strip()) for part in raw.split(',')]
+            if len(values) != 2:
+                raise ValueError
+            return Condition(name, op, tuple(values))
+        if op == 'in':
+            values = [coerce(part.strip()) for part in raw.split(',') if part.strip()]
+            if not values or len(values) > MAX_IN_VALUES:
+                raise ValueError
+            return Condition(name, op, tuple(values))
+        return Condition(name, op, coerce(raw))
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}__{op}: {raw!r}")
+
+
+# Every filter in the query string, skipping the endpoint's own parameters.
+# Unknown columns or operators are errors rather than being silently ignored.
+def parse_filters(args, table, reserved):
+    conditions = []
+    for key, raw in args.items(multi=True):
+        if key in reserved:
+            continue
+        name, _, op = key.partition('__')
+        op = op or 'eq'
+        if name not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter {key!r}; filterable columns are: {', '.join(FILTER_COLUMNS)}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator in {key!r}; operators are: {', '.join(OPERATORS)}")
+        conditions.append(parse_condition(table, name, op, raw))
+    return conditions
+
+
+# The conditions as SQL expressions; comparisons leave out NULLs just like the archive's
+def filter_clauses(table, conditions):
+    clauses = []
+    for name, op, value in conditions:
+        column = table.c[name]
+        if op == 'eq':
+            clauses.append(column == value)
+        elif op == 'ne':
+            clauses.append(and_(column.isnot(None), column != value))
+        elif op == 'lt':
+            clauses.append(column < value)
+        elif op == 'lte':
+            clauses.append(column <= value)
+        elif op == 'gt':
+            clauses.append(column > value)
+        elif op == 'gte':
+            clauses.append(column >= value)
+        elif op == 'between':
+            clauses.append(column.between(*value))
+        elif op == 'in':
+            clauses.append(column.in_(value))
+        else:
+            clauses.append(column.is_(None) if value else column.isnot(None))
+    return clauses
+
+
+# The same conditions checked against a row dict in Python, for rows that are never queried (the live stream)
+def row_matches(row, conditions):
+    for name, op, value in conditions:
+        actual = row.get(name)
+        if op == 'isnull':
+            if (actual is None) != value:
+                return False
+        elif actual is None:
+            return False
+        elif op == 'between':
+            if not value[0] <= actual <= value[1]:
+                return False
+        elif op == 'in':
+            if actual not in value:
+                return False
+        elif not COMPARISONS[op](actual, value):
+            return False
+    return True
+
+
+# ?sort=becquerel or ?sort=-becquerel, from the sort keys the endpoint offers -> (name, descending)
+def parse_sort(value, sort_keys, default):
+    if not value:
+        return default, False
+    descending = value.startswith('-')
+    name = value.lstrip('-+')
+    if name not in sort_keys:
+        raise ValueError(f"sort must be one of: {', '.join(sort_keys)} (prefix with - for descending)")
+    return name, descending
+
+
+# The SQL a statement runs, its bound parameters and the database's plan for it, one line per plan step.
+# The plan comes from EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (others) of the statement with its parameters
+# rendered as literals, run as plain SQL: executed as the statement, the plan rows would be read through
+# the column types of the select.
+def explain(session, statement):
+    dialect = session.get_bind().dialect
+    compiled = statement.compile(dialect=dialect)
+    literal = statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+    plan = [row[-1] for row in session.connection().exec_driver_sql(prefix + str(literal)).all()]
+    params = {name: value if value is None or isinstance(value, (bool, int, float, str)) else str(value)
+              for name, value in compiled.params.items()}
+    return {"sql": str(compiled), "params": params, "plan": plan}
@@ -0,0 +1,175 @@
+from datetime import timedelta
+import math
+
+from sqlalchemy import and_, case, delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from serializers import METRIC_COLUMNS
+
+# Bucket sizes kept in the rollup table
+GRANULARITIES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def bucket_start(moment, granularity):
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Is a naive UTC datetime on a bucket boundary (so rollup rows cover the range exactly)?
+def is_aligned(moment, granularity):
+    return moment is None or bucket_start(moment, granularity) == moment
+
+
+# Fold observations into {(granularity, bucket, metric): [count, sum, min, max]}.
+# Each observation is a mapping with observed_at_utc and the metric columns.
+def rollup_deltas(observations, deltas=None):
+    deltas = {} if deltas is None else deltas
+    for observation in observations:
+        moment = observation['observed_at_utc']
+        if moment is None:
+            continue
+        for metric in METRIC_COLUMNS:
+            value = observation[metric]
+            if value is None:
+                continue
+            for granularity in GRANULARITIES:
+                key = (granularity, bucket_start(moment, granularity), metric)
+                delta = deltas.get(key)
+                if delta is None:
+                    deltas[key] = [1, value, value, value]
+                else:
+                    delta[0] += 1
+                    delta[1] += value
+                    if value < delta[2]:
+                        delta[2] = value
+                    if value > delta[3]:
+                        delta[3] = value
+    return deltas
+
+
+def _delta_rows(deltas):
+    return [
+        {'granularity': granularity, 'bucket_start': bucket, 'metric': metric,
+         'count': count, 'sum': total, 'min': minimum, 'max': maximum}
+        for (granularity, bucket, metric), (count, total, minimum, maximum) in deltas.items()
+    ]
+
+
+# Merge new observations into the rollup table with one executemany upsert
+def add_to_rollups(connection, rollup_table, observations):
+    upsert_deltas(connection, rollup_table, rollup_deltas(observations))
+
+
+def upsert_deltas(connection, rollup_table, deltas):
+    if not deltas:
+        return
+
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(rollup_table)
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=['granularity', 'bucket_start', 'metric'],
+        set_={
+            'count': rollup_table.c.count + excluded['count'],
+            'sum': rollup_table.c.sum + excluded['sum'],
+            'min': case((excluded['min'] < rollup_table.c.min, excluded['min']), else_=rollup_table.c.min),
+            'max': case((excluded['max'] > rollup_table.c.max, excluded['max']), else_=rollup_table.c.max),
+        }
+    )
+    connection.execute(statement, _delta_rows(deltas))
+
+
+# Take observations back out of the rollup table. Count and sum are subtracted; min/max can't be,
+# so when a removed value was a bucket's min or max that one bucket is recomputed from the raw table,
+# together with archived(granularity, bucket_start, metric), the (min, max) of the bucket's archived rows
+# (or None), since the rollups cover those too. Must run after the raw rows have been deleted or changed.
+def remove_from_rollups(connection, rollup_table, observation_table, observations, archived=None):
+    for row in _delta_rows(rollup_deltas(observations)):
+        where = and_(
+            rollup_table.c.granularity == row['granularity'],
+            rollup_table.c.bucket_start == row['bucket_start'],
+            rollup_table.c.metric == row['metric'],
+        )
+        current = connection.execute(
+            select(rollup_table.c.count, rollup_table.c.min, rollup_table.c.max).where(where)
+        ).first()
+        if current is None:
+            continue
+
+        count = current.count - row['count']
+        if count <= 0:
+            connection.execute(delete(rollup_table).where(where))
+            continue
+
+        values = {'count': count, 'sum': rollup_table.c.sum - row['sum']}
+        if row['min'] <= current.min or row['max'] >= current.max:
+            metric = observation_table.c[row['metric']]
+            moment = observation_table.c.observed_at_utc
+            start = row['bucket_start']
+            extremes = [connection.execute(
+                select(func.min(metric), func.max(metric))
+                .where(
+                    moment >= start,
+                    moment < start + GRANULARITIES[row['granularity']],
+                    observation_table.c.deleted.is_(None)
+                )
+            ).first()]
+            if archived is not None:
+                extremes.append(archived(row['granularity'], start, row['metric']))
+            minimums = [extreme[0] for extreme in extremes if extreme is not None and extreme[0] is not None]
+            maximums = [extreme[1] for extreme in extremes if extreme is not None and extreme[1] is not None]
+            values['min'] = min(minimums) if minimums else None
+            values['max'] = max(maximums) if maximums else None
+        connection.execute(update(rollup_table).where(where).values(**values))
+
+
+# Fold one set of deltas into another, as upsert_deltas() would
+def merge_deltas(deltas, other):
+    for key, (count, total, minimum, maximum) in other.items():
+        delta = deltas.get(key)
+        if delta is None:
+            deltas[key] = [count, total, minimum, maximum]
+        else:
+            delta[0] += count
+            delta[1] += total
+            delta[2] = minimum if delta[2] is None else min(delta[2], minimum)
+            delta[3] = maximum if delta[3] is None else max(delta[3], maximum)
+    return deltas
+
+
+# The deltas of every live (not soft-deleted) raw row, streamed in chunks
+def live_rollup_deltas(connection, observation_table, chunk_size=1000):
+    statement = select(
+        observation_table.c.observed_at_utc, *[observation_table.c[metric] for metric in METRIC_COLUMNS]
+    ).where(observation_table.c.deleted.is_(None)).execution_options(yield_per=chunk_size)
+    return rollup_deltas(connection.execute(statement).mappings())
+
+
+# Recompute every rollup row from the live raw rows
+def rebuild_rollups(connection, rollup_table, observation_table, chunk_size=1000):
+    connection.execute(delete(rollup_table))
+    deltas = live_rollup_deltas(connection, observation_table, chunk_size)
+    upsert_deltas(connection, rollup_table, deltas)
+    return len(deltas)
+
+
+# The rollup rows that differ from a rebuild from the live raw rows plus `extra` deltas (the archive's), as
+# [((granularity, bucket, metric), stored [count, sum, min, max] or None, expected or None)].
+# Sums are compared with a relative tolerance, since they were added up in a different order.
+def diff_rollups(connection, rollup_table, observation_table, extra=None, chunk_size=1000):
+    expected = merge_deltas(live_rollup_deltas(connection, observation_table, chunk_size), extra or {})
+    stored = {
+        (row.granularity, row.bucket_start, row.metric): [row.count, row.sum, row.min, row.max]
+        for row in connection.execute(select(rollup_table))
+    }
+    differences = []
+    for key in sorted(set(stored) | set(expected)):
+        have, want = stored.get(key), expected.get(key)
+        if have is None or want is None or have[0] != want[0] or have[2:] != want[2:] or \
+                not math.isclose(have[1], want[1], rel_tol=1e-9, abs_tol=1e-9):
+            differences.append((key, have, want))
+    return differences
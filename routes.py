@@ -1,34 +1,1181 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, create_access_token
-from models import db, Observation
-from schemas import ObservationSchema
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from sqlalchemy import insert, or_, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.local import LocalProxy
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone, date as date_type, time as time_type
+import base64
+import binary
+import csv
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import os
+import time
+from ingest import QueueFull
+from geo import EARTH_RADIUS_KM, bbox_around, cell_ranges, haversine_km, parse_bbox, parse_coordinates
+from devices import register_devices, upsert_latest
+from models import db, Device, DeviceLatest, Observation, ObservationGeneration, ObservationRollup, change_timestamp, derived_columns
+from query import Condition, explain, filter_clauses, parse_filters, parse_sort, row_matches
+from search import match_clause, notes_index, parse_search, snippet_column
+from storage import read_session
+from validation import ValidationError, check_ranges, compile_validator
+from rollups import GRANULARITIES, add_to_rollups, is_aligned
+from timestamps import parse_range_bound
+from serializers import METRIC_COLUMNS, OBSERVATION_COLUMNS, compile_serializer, observation_columns, parse_fields, serialize_row, serialize_rows
 
+# The observation and device API, registered on the app by create_app()
 bp = Blueprint('api', __name__)
-obs_schema = ObservationSchema()
-obs_list_schema = ObservationSchema(many=True)
 
-@bp.route('/observations', methods=['POST'])
-@jwt_required()
-def add_observation():
+# The app's services, set up once per app by create_app()
+observation_cache = LocalProxy(lambda: current_app.extensions['observation_cache'])
+# Idempotency key -> (id of the observation it created, status the upload was answered with),
+# so most retries are answered without touching the database
+seen_keys = LocalProxy(lambda: current_app.extensions['seen_keys'])
+ingest_queue = LocalProxy(lambda: current_app.extensions['ingest_queue'])
+# Fans newly committed observations out to /observations/stream clients
+observation_stream = LocalProxy(lambda: current_app.extensions['observation_stream'])
+
+# Archived observations, which list, range, aggregate, stats and export read alongside the table; None until
+# `flask archive` has created the archive. archive.py (and NumPy with it) is only imported once there is one.
+def get_cold_archive(create=False):
+    archive = current_app.extensions.get('cold_archive')
+    if archive is None and (create or os.path.isdir(current_app.config['ARCHIVE_DIR'])):
+        from archive import ColdArchive
+        archive = current_app.extensions['cold_archive'] = ColdArchive(current_app.config['ARCHIVE_DIR'])
+    return archive
+
+# Columns a client is allowed to send when creating an observation
+OBSERVATION_FIELDS = [
+    'date', 'time', 'time_zone_offset', 'coordinates', 'temperature_water', 'temperature_air',
+    'humidity', 'wind_speed', 'wind_direction', 'precipitation', 'haze', 'becquerel', 'notes', 'device_id'
+]
+REQUIRED_FIELDS = ['date', 'time', 'time_zone_offset', 'coordinates']
+
+# The validators for JSON observations, compiled once from the Observation columns.
+# New observations may also carry their own id and idempotency_key; updates may not.
+validate_observation = compile_validator(Observation.__table__, OBSERVATION_FIELDS + ['id', 'idempotency_key'], REQUIRED_FIELDS)
+validate_update = compile_validator(Observation.__table__, OBSERVATION_FIELDS, REQUIRED_FIELDS)
+
+# Validate one JSON observation and turn it into a row dict ready for insert
+def parse_observation(data):
+    row = validate_observation(data)
+    # A device may pick the observation id itself; it then doubles as the dedup key
+    if row['id'] is None:
+        del row['id']
+    row['idempotency_key'] = row['idempotency_key'] or row.get('id')
+    return row
+
+def check_key(value, max_length, name):
+    if not isinstance(value, str) or not value or len(value) > max_length:
+        raise ValueError(f"'{name}' must be a string of at most {max_length} characters")
+    return value
+
+# Read the body of a batch upload, either a JSON array or NDJSON (one object per line)
+def read_batch_body():
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+        return items
+
     data = request.get_json()
+    if not isinstance(data, list):
+        raise ValueError("Batch body must be a JSON array of observations")
+    return data
+
+# Radius used by ?near= when no ?radius_km= is given
+DEFAULT_RADIUS_KM = 10.0
+
+# Page size used when the client doesn't send ?limit=, and the most a client may ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Sort keys the list endpoints page through; each one is backed by a composite index
+DATE_TIME_KEY = (Observation.date, Observation.time, Observation.id)
+OBSERVED_AT_KEY = (Observation.observed_at_utc, Observation.id)
+CHANGES_KEY = (Observation.updated, Observation.id)
+BECQUEREL_KEY = (Observation.becquerel, Observation.id)
+
+# ?sort= values for the list endpoints (prefix with - for descending)
+SORT_KEYS = {'date': DATE_TIME_KEY, 'observed_at_utc': OBSERVED_AT_KEY, 'becquerel': BECQUEREL_KEY}
+
+# Query parameters of the list endpoints that aren't column filters
+LIST_PARAMETERS = {'fields', 'limit', 'after', 'bbox', 'near', 'radius_km', 'sort', 'explain'}
+RANGE_PARAMETERS = LIST_PARAMETERS | {'start', 'end', 'start_date', 'end_date'}
+SEARCH_PARAMETERS = (RANGE_PARAMETERS - {'sort'}) | {'q'}
+
+# Search results page through the best matches first
+SEARCH_KEY = (notes_index.c.rank, Observation.id)
+
+# Cursors are the sort key values of the last row on a page, base64 encoded so clients treat them as opaque
+def encode_cursor(row, key):
+    values = row[-len(key):]
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor, key):
     try:
-        observation = obs_schema.load(data)
-        new_observation = Observation(**observation)
-        db.session.add(new_observation)
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if len(values) != len(key):
+            raise ValueError
+        parsed = []
+        for column, value in zip(key, values):
+            if value is None:
+                pass
+            elif isinstance(column.type, db.DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, db.Date):
+                value = date_type.fromisoformat(value)
+            elif isinstance(column.type, db.Time):
+                value = time_type.fromisoformat(value)
+            parsed.append(value)
+        return tuple(parsed)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# Select only the requested columns as plain tuples, with the pagination key appended at the end
+def select_observation_columns(fields, key=DATE_TIME_KEY):
+    return select(
+        *observation_columns(Observation, fields),
+        *[column.label(f'_key{index}') for index, column in enumerate(key)]
+    )
+
+# The ?limit= page size
+def page_limit():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+# One page of a statement: seek past the cursor on the key's index instead of using OFFSET,
+# so every page costs the same no matter how deep the client pages.
+# Selects one extra row, to know whether there is a next page.
+def seek_statement(statement, key, cursor, limit, descending=False):
+    if cursor is not None:
+        statement = statement.where(tuple_(*key) < cursor if descending else tuple_(*key) > cursor)
+    order = [column.desc() for column in key] if descending else key
+    return statement.order_by(*order).limit(limit + 1)
+
+# seek_statement() for the ?after= (or `cursor_arg`) cursor and ?limit= of the request.
+# Returns the statement, the cursor and the limit.
+def page_statement(statement, key=DATE_TIME_KEY, cursor_arg='after', descending=False):
+    limit = page_limit()
+    after = request.args.get(cursor_arg)
+    cursor = decode_cursor(after, key) if after else None
+    return seek_statement(statement, key, cursor, limit, descending), cursor, limit
+
+# The rows of seek_statement(), with archived(cursor, count), the matching archive rows after the cursor,
+# merged in by key. Up to limit + 1 rows.
+def page_rows(statement, key, cursor, limit, archived=None, descending=False):
+    rows = read_session.execute(seek_statement(statement, key, cursor, limit, descending)).all()
+    if archived is not None:
+        merged = heapq.merge(rows, archived(cursor, limit + 1), key=lambda row: tuple(row[-len(key):]), reverse=descending)
+        rows = list(itertools.islice(merged, limit + 1))
+    return rows
+
+# The page out of up to limit + 1 rows, and the cursor of the next page (None on the last one)
+def page_result(rows, key, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], key)
+    return rows, None
+
+# Keyset pagination over page_statement(), with archive rows merged in by page_rows()
+def paginate(statement, key=DATE_TIME_KEY, cursor_arg='after', archived=None, descending=False):
+    limit = page_limit()
+    after = request.args.get(cursor_arg)
+    cursor = decode_cursor(after, key) if after else None
+    return page_result(page_rows(statement, key, cursor, limit, archived, descending), key, limit)
+
+# Does the sort key start with a column that can be NULL?
+def is_nullable(key):
+    return Observation.__table__.c[key[0].name].nullable
+
+# A list statement narrowed to the rows that have a value for its sort column, the part of the list that is
+# paged in key order (for ?explain=)
+def valued_rows(statement, key):
+    return statement.where(key[0].isnot(None)) if is_nullable(key) else statement
+
+# One page of a list request in its ?sort= order, with the archive rows in the time range merged in.
+# Rows without a value for a nullable sort column can't be ordered by it, so they are paged after the
+# others, by id in the same direction: they come last in either direction and every order returns the
+# same rows. A cursor among them has None for the value.
+def paginate_list(statement, fields, key, conditions, descending, time_range=(None, None, False)):
+    if not is_nullable(key):
+        archived = archived_rows(fields, key, *time_range, where=conditions, descending=descending)
+        return paginate(statement, key, archived=archived, descending=descending)
+
+    limit = page_limit()
+    after = request.args.get('after')
+    cursor = decode_cursor(after, key) if after else None
+    column = key[0]
+    rows = []
+    if cursor is None or cursor[0] is not None:
+        where = conditions + [Condition(column.name, 'isnull', False)]
+        archived = archived_rows(fields, key, *time_range, where=where, descending=descending)
+        rows = page_rows(statement.where(column.isnot(None)), key, cursor, limit, archived, descending)
+        cursor = None
+    if len(rows) <= limit:
+        id_key = key[-1:]
+        where = conditions + [Condition(column.name, 'isnull', True)]
+        archived = archived_rows(fields, id_key, *time_range, where=where, descending=descending)
+        if archived is not None:
+            # Shaped like the table's rows, which end with the whole key
+            archived = without_values(archived)
+        rows += page_rows(statement.where(column.is_(None)), id_key, cursor and cursor[-1:], limit - len(rows), archived, descending)
+    return page_result(rows, key, limit)
+
+# Archive rows selected by id alone, with a None sort value put in front of the id
+def without_values(archived):
+    return lambda cursor, count: [row[:-1] + (None,) + row[-1:] for row in archived(cursor, count)]
+
+# ?explain=1 answers with the page query's SQL and plan instead of its rows; only in debug mode or with QUERY_EXPLAIN
+def wants_explain():
+    if not request.args.get('explain'):
+        return False
+    if not (current_app.debug or current_app.config['QUERY_EXPLAIN']):
+        raise ValueError("explain is only available in debug mode or with QUERY_EXPLAIN set")
+    return True
+
+# The ?sort= key and direction, and the column filters of a list request
+def parse_list_query(reserved, default_sort):
+    sort, descending = parse_sort(request.args.get('sort'), SORT_KEYS, default_sort)
+    conditions = parse_filters(request.args, Observation.__table__, reserved)
+    return SORT_KEYS[sort], descending, conditions
+
+# Give a validated row its id and derived columns so it can go straight into a bulk insert
+# (bulk inserts skip the ORM insert hooks). Binary records arrive with the derived columns already set.
+# The timestamps are left to bulk_insert().
+def prepare_row(row):
+    row.setdefault('id', str(uuid4()))
+    row.setdefault('idempotency_key', None)
+    row.setdefault('device_id', None)
+    if 'observed_at_utc' not in row:
+        row.update(derived_columns(row['date'], row['time'], row['time_zone_offset'], row['coordinates']))
+    return row
+
+# One executemany insert, one rollup upsert, one latest-per-device upsert and one commit for a list of prepared rows.
+# The rows are stamped once the transaction has begun (and on SQLite holds the write lock), not when they were
+# received or queued, so the change feed sees them in the order they commit.
+def bulk_insert(rows):
+    try:
+        connection = db.session.connection()
+        now = change_timestamp(connection, Observation.__table__)
+        for row in rows:
+            row['created'] = row['updated'] = now
+        register_devices(connection, Device.__table__, [row['device_id'] for row in rows], now)
+        db.session.execute(insert(Observation), rows)
+        add_to_rollups(connection, ObservationRollup.__table__, rows)
+        upsert_latest(connection, DeviceLatest.__table__, rows)
         db.session.commit()
-        return jsonify(obs_schema.dump(new_observation)), 201
+    except Exception:
+        db.session.rollback()
+        raise
+
+# Insert prepared rows, skipping any whose idempotency key is already stored.
+# Existing keys are only looked up after the unique index rejects the insert, so new keys cost one write.
+# `status` is what the uploads were answered with (202 when they were queued), for replaying to retries.
+# Returns {idempotency_key: existing observation id} for the rows that were skipped.
+def insert_observations(rows, status=201):
+    existing = {}
+    inserted = rows
+    try:
+        bulk_insert(rows)
+    except IntegrityError:
+        keys = [row['idempotency_key'] for row in rows if row['idempotency_key']]
+        if not keys:
+            raise
+        existing = dict(db.session.execute(
+            select(Observation.idempotency_key, Observation.id).where(Observation.idempotency_key.in_(keys))
+        ).all())
+        inserted = [row for row in rows if row['idempotency_key'] not in existing]
+        if inserted:
+            bulk_insert(inserted)
+        else:
+            db.session.rollback()  # Nothing to write; don't keep the write connection until the request ends
+
+    for row in rows:
+        if row['idempotency_key']:
+            seen_keys.set(row['idempotency_key'], (existing.get(row['idempotency_key'], row['id']), status))
+    publish_observations(inserted)
+    return existing
+
+# Hand committed rows to this worker's stream subscribers, each serialized once however many are listening
+def publish_observations(rows):
+    if not observation_stream.subscribers:
+        return
+    to_dict = compile_serializer(tuple(OBSERVATION_COLUMNS))[1]
+    observation_stream.publish([
+        (row, event_frame(to_dict(tuple(row.get(name) for name in OBSERVATION_COLUMNS)), (row['updated'], row['id'])))
+        for row in rows
+    ])
+
+# One Server-Sent Event. Its id is a change feed cursor, so a client reconnecting with it as Last-Event-ID
+# (or passing it to /observations/changes?since=) carries on right after this observation.
+def event_frame(observation, key_values):
+    return f"id: {encode_cursor(key_values, CHANGES_KEY)}\nevent: observation\ndata: {current_app.json.dumps(observation)}\n\n"
+
+# API endpoint to create a new observation
+@bp.route('/observations', methods=['POST'])
+def create_observation():
+    try:
+        if request.mimetype == binary.MIMETYPE:
+            # One fixed-size binary record from a low-power device
+            rows = binary.decode_records(request.get_data())
+            if len(rows) != 1:
+                raise ValueError("Send several binary records to /observations/batch")
+            row = check_ranges(rows[0])
+        else:
+            # Validate the JSON body and convert date and time from strings to Python objects
+            row = parse_observation(request.get_json())
+
+        if request.headers.get('Idempotency-Key'):
+            row['idempotency_key'] = check_key(request.headers['Idempotency-Key'], 64, 'Idempotency-Key')
+        if row.get('device_id') is None:
+            row['device_id'] = header_device_id()
+        row = prepare_row(row)
+
+        # A retry of a recent upload is answered from memory with the original result
+        key = row['idempotency_key']
+        original = seen_keys.get(key) if key else None
+        if original is not None:
+            return replayed_response(*original)
+
+        # In async mode the row is only queued; the background writer commits it shortly after
+        if current_app.config['ASYNC_INGEST']:
+            try:
+                ingest_queue.put(row)
+            except QueueFull:
+                return jsonify({"error": "Server busy, retry later"}), 429, {'Retry-After': '1'}
+            if key:
+                seen_keys.set(key, (row['id'], 202))
+            return jsonify({"message": INGEST_MESSAGES[202], "data": row['id']}), 202
+
+        existing = insert_observations([row])
+        if key in existing:
+            return replayed_response(existing[key], 201)
+        return jsonify({"message": INGEST_MESSAGES[201], "data": row['id']}), 201
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        return jsonify({"error": f"Failed to create observation: {str(e)}"}), 400
+
+# Devices may name themselves once per request with X-Device-Id instead of in every reading
+# (binary records have no room for it)
+def header_device_id():
+    device_id = request.headers.get('X-Device-Id')
+    return check_key(device_id, 64, 'X-Device-Id') if device_id else None
+
+# What POST /observations answers a new upload with: created, or queued in async mode
+INGEST_MESSAGES = {201: "Observation created successfully", 202: "Observation accepted"}
+
+# The response the first upload with this idempotency key got
+def replayed_response(observation_id, status):
+    response = jsonify({"message": INGEST_MESSAGES[status], "data": observation_id})
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
+
+# API endpoint to create many observations at once (devices replaying buffered readings)
+@bp.route('/observations/batch', methods=['POST'])
+def create_observations_batch():
+    # Binary batches decode straight into rows; JSON and NDJSON items are validated one by one below
+    is_binary = request.mimetype == binary.MIMETYPE
+    try:
+        items = binary.decode_records(request.get_data()) if is_binary else read_batch_body()
+        device_id = header_device_id()
+    except Exception as e:
+        return jsonify({"error": f"Invalid batch body: {str(e)}"}), 400
+
+    # Validate every item first so one bad reading doesn't block the rest.
+    # Items whose idempotency key was already seen (earlier in this batch or recently) are not written again.
+    results = []
+    rows = []
+    batch_keys = {}
+    for index, item in enumerate(items):
+        try:
+            row = check_ranges(item) if is_binary else parse_observation(item)
+        except ValidationError as e:
+            results.append({"index": index, "status": "error", "error": str(e), "fields": e.errors})
+            continue
+        except Exception as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+            continue
+        if row.get('device_id') is None:
+            row['device_id'] = device_id
+        row = prepare_row(row)
+        key = row['idempotency_key']
+        seen = seen_keys.get(key) if key else None
+        original_id = batch_keys.get(key) or (seen[0] if seen else None)
+        if original_id is not None:
+            results.append({"index": index, "status": "duplicate", "id": original_id})
+            continue
+        if key:
+            batch_keys[key] = row['id']
+        rows.append(row)
+        results.append({"index": index, "status": "created", "id": row['id']})
+
+    if not rows and not any(result['status'] == 'duplicate' for result in results):
+        return jsonify({"message": "No observations created", "results": results}), 400
+
+    try:
+        existing = insert_observations(rows) if rows else {}
+    except Exception as e:
+        return jsonify({"error": f"Failed to create observations: {str(e)}"}), 400
+
+    # Rows the unique index caught as retries of older uploads
+    if existing:
+        for result, row in zip([result for result in results if result['status'] == 'created'], rows):
+            if row['idempotency_key'] in existing:
+                result.update(status="duplicate", id=existing[row['idempotency_key']])
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    status = 201 if all(result['status'] != 'error' for result in results) else 207
+    return jsonify({
+        "message": f"{created} of {len(items)} observations created",
+        "results": results
+    }), status
+
+# Validators for any list of observations. Every insert, update and soft delete moves the newest `updated`
+# forward, and rows that leave the table another way bump the generation, so together they change whenever
+# a list can; max(updated) is read off the end of the (updated, id) index and the generation is one row,
+# so this costs the same however big the table is. The query string is mixed in so every page/filter
+# combination gets its own ETag.
+def collection_validators():
+    generation = select(ObservationGeneration.generation).scalar_subquery()
+    last_modified, generation = read_session.execute(select(db.func.max(Observation.updated), generation)).one()
+    etag = hashlib.md5(f"{generation}:{last_modified}:{request.full_path}".encode()).hexdigest()
+    return etag, last_modified
+
+# Validators for one observation from the updated (or created) timestamp of the version being served
+def item_validators(id, last_modified):
+    etag = hashlib.md5(f"{id}:{last_modified}:{request.full_path}".encode()).hexdigest()
+    return etag, last_modified
+
+# Does the client's If-None-Match / If-Modified-Since say it already has this version?
+def is_not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return response
 
+def not_modified_response(etag, last_modified):
+    return with_validators(Response(status=304), etag, last_modified)
+
+# API endpoint to get all observations
 @bp.route('/observations', methods=['GET'])
-@jwt_required()
 def get_observations():
-    filters = request.args  # Use query parameters for filtering
-    query = Observation.query
+    # Unchanged polls are answered from the validators alone
+    etag, last_modified = collection_validators()
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    # Fetch one page of observations from the database, only the columns asked for in ?fields=,
+    # filtered by any ?<column>=, ?<column>__<op>= and ordered by ?sort=
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        key, descending, conditions = parse_list_query(LIST_PARAMETERS, 'date')
+        statement = select_observation_columns(fields, key).where(
+            Observation.deleted.is_(None), *spatial_filters(), *filter_clauses(Observation.__table__, conditions)
+        )
+        if wants_explain():
+            return jsonify(explain(read_session, page_statement(valued_rows(statement, key), key, descending=descending)[0])), 200
+        rows, next_cursor = paginate_list(statement, fields, key, conditions, descending)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = jsonify({"data": serialize_rows(rows, fields), "next_cursor": next_cursor})
+    return with_validators(response, etag, last_modified), 200
+
+# The ?start= / ?end= query parameters as naive UTC datetimes (either may be None),
+# plus whether the end bound is exclusive
+def parse_time_range():
+    start = request.args.get('start') or request.args.get('start_date')
+    end = request.args.get('end') or request.args.get('end_date')
+    start_utc = parse_range_bound(start)[0] if start else None
+    end_utc, end_exclusive = parse_range_bound(end, end=True) if end else (None, False)
+    return start_utc, end_utc, end_exclusive
+
+# Filters on a timestamp column (observed_at_utc by default) for the ?start= / ?end= query parameters
+def time_range_filters(column=None):
+    column = Observation.observed_at_utc if column is None else column
+    start_utc, end_utc, end_exclusive = parse_time_range()
+    filters = []
+    if start_utc is not None:
+        filters.append(column >= start_utc)
+    if end_utc is not None:
+        filters.append(column < end_utc if end_exclusive else column <= end_utc)
+    return filters
+
+# Great-circle distance in km from a point to each observation, evaluated in SQL
+def distance_expression(latitude, longitude):
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.haversine_km(Observation.latitude, Observation.longitude, latitude, longitude)
+    half_lat = db.func.radians(Observation.latitude - latitude) / 2
+    half_lon = db.func.radians(Observation.longitude - longitude) / 2
+    a = (db.func.power(db.func.sin(half_lat), 2) +
+         db.func.cos(db.func.radians(latitude)) * db.func.cos(db.func.radians(Observation.latitude)) *
+         db.func.power(db.func.sin(half_lon), 2))
+    return 2 * EARTH_RADIUS_KM * db.func.asin(db.func.sqrt(a))
+
+# Narrow to a bounding box through the grid_cell index, then check the exact edges
+def bbox_filters(min_lat, min_lon, max_lat, max_lon):
+    filters = [Observation.latitude.between(min_lat, max_lat), Observation.longitude.between(min_lon, max_lon)]
+    ranges = cell_ranges(min_lat, min_lon, max_lat, max_lon)
+    if ranges:
+        filters.insert(0, or_(*[Observation.grid_cell.between(first, last) for first, last in ranges]))
+    return filters
+
+# ?bbox=min_lon,min_lat,max_lon,max_lat and ?near=lat,lon&radius_km= parsed into
+# (min_lat, min_lon, max_lat, max_lon) and (latitude, longitude, radius_km), each None if not given
+def spatial_params():
+    bbox = request.args.get('bbox')
+    bbox = parse_bbox(bbox) if bbox else None
+
+    near = request.args.get('near')
+    if near:
+        latitude, longitude = parse_coordinates(near)
+        try:
+            radius_km = float(request.args.get('radius_km', DEFAULT_RADIUS_KM))
+        except ValueError:
+            raise ValueError("radius_km must be a number")
+        if radius_km <= 0:
+            raise ValueError("radius_km must be positive")
+        near = (latitude, longitude, radius_km)
+    return bbox, near
+
+# Filters for ?bbox= and ?near=
+# A radius search first narrows to the circle's bounding box, so distances are only computed for those rows
+def spatial_filters():
+    bbox, near = spatial_params()
+    filters = []
+    if bbox:
+        filters += bbox_filters(*bbox)
+    if near:
+        latitude, longitude, radius_km = near
+        filters += bbox_filters(*bbox_around(latitude, longitude, radius_km))
+        filters.append(distance_expression(latitude, longitude) <= radius_km)
+    return filters
+
+# One archived observation as a row of `fields` (None if it isn't archived). The archive has no index on id,
+# so every month's id column is compared; item reads of archived rows are rare and full rows are cached.
+def archived_observation(id, fields):
+    cold_archive = get_cold_archive()
+    if cold_archive is None:
+        return None
+    key_names = tuple(column.name for column in OBSERVED_AT_KEY)
+    rows = cold_archive.select(fields, key_names, 1, where=[Condition('id', 'eq', id)])
+    return rows[0][:len(fields)] if rows else None
+
+# Archived observations are read-only: changing one would mean rewriting its month of the archive and the
+# rollups it is counted in, so PUT and DELETE answer 409 and the row stays as it was archived
+def archived_conflict(id):
+    return jsonify({"error": f"Observation {id} is archived and read-only"}), 409
+
+# The archive rows in a time range matching the same ?bbox=, ?near= and column filters, for paginate()
+# (None when nothing is archived)
+def archived_rows(fields, key, start_utc=None, end_utc=None, end_exclusive=False, where=(), descending=False):
+    cold_archive = get_cold_archive()
+    if cold_archive is None:
+        return None
+    bbox, near = spatial_params()
+    key_names = tuple(column.name for column in key)
+
+    def select_archived(cursor, count):
+        return cold_archive.select(fields, key_names, count, after=cursor, start=start_utc, end=end_utc,
+                                   end_exclusive=end_exclusive, bbox=bbox, near=near, where=where, descending=descending)
+    return select_archived
+
+# API endpoint to get observations between two points in time, paged the same way as the full list.
+# ?start= / ?end= take a date or an ISO datetime with offset (start_date / end_date are still accepted)
+# and are compared against observed_at_utc, so readings from every time zone line up.
+@bp.route('/observations/range', methods=['GET'])
+def get_observations_by_date_range():
+    # time_range_filters() reads the same parameters; here both ends are required
+    start = request.args.get('start') or request.args.get('start_date')
+    end = request.args.get('end') or request.args.get('end_date')
+    if not start or not end:
+        return jsonify({"error": "Both start and end are required"}), 400
+
+    etag, last_modified = collection_validators()
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    try:
+        # Query the database for one page of observations in the range, as an index range scan on observed_at_utc
+        # unless ?sort= asks for another order
+        fields = parse_fields(request.args.get('fields'))
+        key, descending, conditions = parse_list_query(RANGE_PARAMETERS, 'observed_at_utc')
+        statement = select_observation_columns(fields, key).where(
+            Observation.deleted.is_(None), *time_range_filters(), *spatial_filters(),
+            *filter_clauses(Observation.__table__, conditions)
+        )
+        if wants_explain():
+            return jsonify(explain(read_session, page_statement(valued_rows(statement, key), key, descending=descending)[0])), 200
+        rows, next_cursor = paginate_list(statement, fields, key, conditions, descending, parse_time_range())
+
+        # If no observations are found
+        if not rows and not request.args.get('after'):
+            return jsonify({"message": "No observations found in the specified date range"}), 404
+
+        response = jsonify({"data": serialize_rows(rows, fields), "next_cursor": next_cursor})
+        return with_validators(response, etag, last_modified), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# API endpoint to search observation notes: ?q=algae flood* "storm drain", best matches first, each with a
+# snippet of the note around the match and its score (higher is better). Takes the same ?start= / ?end=,
+# ?bbox= / ?near= and column filters as the range endpoint. Searches the live table through its FTS5
+# index; archived observations aren't indexed.
+@bp.route('/observations/search', methods=['GET'])
+def search_observations():
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({"error": "Text search needs the SQLite FTS5 index"}), 400
+
+    etag, last_modified = collection_validators()
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+
+    try:
+        query = parse_search(request.args.get('q'))
+        fields = parse_fields(request.args.get('fields'))
+        conditions = parse_filters(request.args, Observation.__table__, SEARCH_PARAMETERS)
+        statement = (
+            select(
+                *observation_columns(Observation, fields), snippet_column(),
+                *[column.label(f'_key{index}') for index, column in enumerate(SEARCH_KEY)]
+            )
+            .select_from(notes_index)
+            .join(Observation, Observation.id == notes_index.c.id)
+            .where(
+                match_clause(query), Observation.deleted.is_(None), *time_range_filters(), *spatial_filters(),
+                *filter_clauses(Observation.__table__, conditions)
+            )
+        )
+        if wants_explain():
+            return jsonify(explain(read_session, page_statement(statement, SEARCH_KEY)[0])), 200
+        rows, next_cursor = paginate(statement, SEARCH_KEY)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    to_dict = compile_serializer(tuple(fields))[1]
+    data = [dict(to_dict(row), snippet=row[len(fields)], score=-row[-2]) for row in rows]
+    response = jsonify({"data": data, "next_cursor": next_cursor})
+    return with_validators(response, etag, last_modified), 200
+
+# ?metrics=becquerel,humidity as a list of metric columns (becquerel if not given)
+def parse_metrics():
+    metrics = [metric.strip() for metric in request.args.get('metrics', 'becquerel').split(',') if metric.strip()]
+    unknown = [metric for metric in metrics if metric not in METRIC_COLUMNS]
+    if not metrics or unknown:
+        raise ValueError(f"metrics must be chosen from: {', '.join(METRIC_COLUMNS)}")
+    return metrics
+
+# Bucket sizes for aggregation, as SQLite strftime formats and Postgres date_trunc units
+BUCKETS = {
+    'minute': ('%Y-%m-%d %H:%M:00', 'minute'),
+    'hour': ('%Y-%m-%d %H:00:00', 'hour'),
+    'day': ('%Y-%m-%d 00:00:00', 'day'),
+}
+MAX_BUCKETS = 10000
+
+# SQL expression that truncates observed_at_utc to the start of its bucket
+def bucket_expression(bucket):
+    sqlite_format, postgres_unit = BUCKETS[bucket]
+    if db.engine.dialect.name == 'sqlite':
+        return db.func.strftime(sqlite_format, Observation.observed_at_utc)
+    return db.func.date_trunc(postgres_unit, Observation.observed_at_utc)
+
+# API endpoint to downsample observations into time buckets, e.g.
+# /observations/aggregate?bucket=hour&start=2024-01-01&end=2024-01-31&metrics=becquerel,humidity
+# min/max/mean/count are computed in SQL, so only one row per bucket leaves the database
+@bp.route('/observations/aggregate', methods=['GET'])
+def aggregate_observations():
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKETS:
+        return jsonify({"error": f"bucket must be one of: {', '.join(BUCKETS)}"}), 400
+
+    try:
+        metrics = parse_metrics()
+        start_utc, end_utc, end_exclusive = parse_time_range()
+        filters = time_range_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Hour and day buckets come straight from the rollup table when the range covers whole buckets
+    if bucket in GRANULARITIES and is_aligned(start_utc, bucket) and (end_utc is None or (end_exclusive and is_aligned(end_utc, bucket))):
+        return aggregate_from_rollups(bucket, metrics)
+
+    bucket_start = bucket_expression(bucket).label('bucket')
+    columns = [bucket_start]
+    for metric in metrics:
+        column = getattr(Observation, metric)
+        columns += [db.func.min(column), db.func.max(column), db.func.avg(column), db.func.count(column)]
+
+    statement = (
+        select(*columns)
+        .where(Observation.observed_at_utc.isnot(None), Observation.deleted.is_(None), *filters)
+        .group_by(bucket_start)
+        .order_by(bucket_start)
+        .limit(MAX_BUCKETS + 1)
+    )
+    rows = read_session.execute(statement).all()
+
+    buckets = {}
+    for row in rows:
+        label = row[0] if isinstance(row[0], str) else row[0].isoformat(' ', 'seconds')
+        entry = buckets[label] = {"bucket": label}
+        for index, metric in enumerate(metrics):
+            minimum, maximum, mean, count = row[1 + index * 4:5 + index * 4]
+            entry[metric] = {"min": minimum, "max": maximum, "mean": mean, "count": count}
+
+    # Archived months are aggregated from their column files and folded into the same buckets
+    cold_archive = get_cold_archive()
+    archived = cold_archive.aggregate(bucket, metrics, start_utc, end_utc, end_exclusive) if cold_archive is not None else {}
+    for moment, values in archived.items():
+        label = moment.isoformat(' ', 'seconds')
+        entry = buckets.get(label)
+        if entry is None:
+            entry = buckets[label] = {"bucket": label}
+            for metric in metrics:
+                entry[metric] = {"min": None, "max": None, "mean": None, "count": 0}
+        for metric, (count, total, minimum, maximum) in values.items():
+            if count:
+                entry[metric] = merge_aggregates(entry[metric], count, total, minimum, maximum)
+
+    if len(buckets) > MAX_BUCKETS:
+        return jsonify({"error": f"More than {MAX_BUCKETS} buckets; use a larger bucket or a shorter range"}), 400
+
+    data = [buckets[label] for label in sorted(buckets)]
+    return jsonify({"bucket": bucket, "metrics": metrics, "source": "raw", "data": data}), 200
+
+# One bucket's min/max/mean/count with another count/sum/min/max folded in
+def merge_aggregates(entry, count, total, minimum, maximum):
+    combined = entry['count'] + count
+    hot_total = entry['mean'] * entry['count'] if entry['count'] else 0.0
+    return {
+        "min": minimum if entry['min'] is None else min(entry['min'], minimum),
+        "max": maximum if entry['max'] is None else max(entry['max'], maximum),
+        "mean": (hot_total + total) / combined,
+        "count": combined,
+    }
+
+# Read the aggregate response out of the rollup table: O(buckets), whatever the number of raw rows
+def aggregate_from_rollups(bucket, metrics):
+    statement = (
+        select(ObservationRollup)
+        .where(
+            ObservationRollup.granularity == bucket,
+            ObservationRollup.metric.in_(metrics),
+            *time_range_filters(ObservationRollup.bucket_start)
+        )
+        .order_by(ObservationRollup.bucket_start)
+        .limit((MAX_BUCKETS + 1) * len(metrics))
+    )
+
+    buckets = {}
+    for rollup in read_session.execute(statement).scalars():
+        entry = buckets.get(rollup.bucket_start)
+        if entry is None:
+            entry = buckets[rollup.bucket_start] = {"bucket": rollup.bucket_start.isoformat(' ', 'seconds')}
+            for metric in metrics:
+                entry[metric] = {"min": None, "max": None, "mean": None, "count": 0}
+        entry[rollup.metric] = {
+            "min": rollup.min, "max": rollup.max, "mean": rollup.sum / rollup.count, "count": rollup.count
+        }
+    if len(buckets) > MAX_BUCKETS:
+        return jsonify({"error": f"More than {MAX_BUCKETS} buckets; use a larger bucket or a shorter range"}), 400
+
+    return jsonify({"bucket": bucket, "metrics": metrics, "source": "rollup", "data": list(buckets.values())}), 200
+
+# observed_at_utc as seconds since 1970, computed in SQL so whole columns come back as plain floats
+def epoch_expression():
+    if db.engine.dialect.name == 'sqlite':
+        return (db.func.julianday(Observation.observed_at_utc) - 2440587.5) * 86400.0
+    return db.func.extract('epoch', Observation.observed_at_utc)
+
+# The request's filtered readings as time-sorted epoch seconds and {metric: float array}, NaN where missing.
+# The matching rows are counted first, so a request over STATS_MAX_ROWS readings is refused before anything
+# is loaded; the rows then go from the DBAPI cursor in chunks into one preallocated ndarray (no ORM objects
+# or Row wrappers), and archived months are sliced out of their memory-mapped columns.
+def load_metric_arrays(metrics):
+    import numpy as np
+    from stats import fetch_array
+
+    start_utc, end_utc, end_exclusive = parse_time_range()
+    bbox, near = spatial_params()
+    device_id = request.args.get('device_id')
+    filters = [Observation.observed_at_utc.isnot(None), Observation.deleted.is_(None), *time_range_filters(), *spatial_filters()]
+    if device_id:
+        filters.append(Observation.device_id == device_id)
+
+    max_rows = current_app.config['STATS_MAX_ROWS']
+    hot_count = read_session.execute(select(db.func.count()).select_from(Observation).where(*filters)).scalar()
+    cold_archive = get_cold_archive()
+    cold_times = None
+    if hot_count <= max_rows and cold_archive is not None:
+        cold_times, cold_columns = cold_archive.metric_columns(
+            metrics, start_utc, end_utc, end_exclusive, bbox=bbox, near=near, device_id=device_id or None
+        )
+    if hot_count + (len(cold_times) if cold_times is not None else 0) > max_rows:
+        raise ValueError(f"More than {max_rows} readings match; use a shorter range or filter by device_id, bbox or near")
+
+    # In the same read transaction as the count; the limit only matters where reads aren't snapshots
+    statement = select(epoch_expression(), *[Observation.__table__.c[metric] for metric in metrics]).where(*filters)
+    result = read_session.connection().execute(statement.order_by(Observation.observed_at_utc).limit(hot_count))
+    hot = fetch_array(result.cursor, hot_count, len(metrics) + 1)
+    result.close()
+    hot[:, 0] = np.round(hot[:, 0], 3)  # julianday() is only good to a few microseconds
+
+    times = hot[:, 0]
+    columns = {metric: hot[:, index + 1] for index, metric in enumerate(metrics)}
+    if cold_times is not None:
+        times = np.concatenate([cold_times, times])
+        columns = {metric: np.concatenate([cold_columns[metric], values]) for metric, values in columns.items()}
+    if len(times) > 1 and (np.diff(times) < 0).any():
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        columns = {metric: values[order] for metric, values in columns.items()}
+    return times, columns
+
+# API endpoint for percentiles, rolling baselines, anomaly flags and correlations over a range, e.g.
+# /observations/stats?metrics=becquerel,humidity&start=2024-01-01&end=2024-02-01&window=1h&threshold=3
+# Takes the same start/end, bbox/near filters as /observations/range, plus ?device_id=, and
+# ?percentiles=5,50,95 and ?points= (rolling mean/std samples per metric).
+# A reading is an anomaly when it is more than threshold standard deviations from the mean of the
+# readings in the window before it.
+@bp.route('/observations/stats', methods=['GET'])
+def observation_stats():
+    import stats  # NumPy is only loaded by the workers that serve this endpoint
+
+    try:
+        metrics = parse_metrics()
+        percentiles = stats.parse_percentiles(request.args.get('percentiles', ','.join(map(str, stats.DEFAULT_PERCENTILES))))
+        window_arg = request.args.get('window', stats.DEFAULT_WINDOW)
+        window = stats.parse_window(window_arg)
+        try:
+            threshold = float(request.args.get('threshold', stats.DEFAULT_THRESHOLD))
+            points = int(request.args.get('points', stats.DEFAULT_POINTS))
+        except ValueError:
+            raise ValueError("threshold must be a number and points an integer")
+        if threshold <= 0 or not 0 <= points <= stats.MAX_POINTS:
+            raise ValueError(f"threshold must be positive and points between 0 and {stats.MAX_POINTS}")
+        times, columns = load_metric_arrays(metrics)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = stats.compute_stats(times, columns, percentiles, window, threshold, points)
+    body.update(window=window_arg, threshold=threshold)
+    return jsonify(body), 200
+
+# Writers that aren't serialized by a lock can commit out of timestamp order, so the newest
+# CHANGE_FEED_DELAY seconds of changes are held back until every write stamped before them has committed
+def settled_filters():
+    delay = current_app.config['CHANGE_FEED_DELAY']
+    return [Observation.updated <= datetime.utcnow() - timedelta(seconds=delay)] if delay else []
+
+# API endpoint for replicas to sync from: every insert, update and delete since ?since=<cursor>, oldest first.
+# Pages seek on the (updated, id) index, so a sync costs what changed rather than the table size.
+# Deleted observations come back as tombstones; next_cursor is always returned to resume from.
+@bp.route('/observations/changes', methods=['GET'])
+def get_observation_changes():
+    try:
+        statement = select_observation_columns(OBSERVATION_COLUMNS, CHANGES_KEY).where(Observation.updated.isnot(None), *settled_filters())
+        rows, next_cursor = paginate(statement, CHANGES_KEY, cursor_arg='since')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    changes = []
+    for observation in serialize_rows(rows):
+        if observation['deleted'] is None:
+            changes.append({"op": "upsert", "id": observation['id'], "updated": observation['updated'], "data": observation})
+        else:
+            changes.append({"op": "delete", "id": observation['id'], "updated": observation['updated'], "deleted": observation['deleted']})
+
+    has_more = next_cursor is not None
+    if rows and not has_more:
+        next_cursor = encode_cursor(rows[-1], CHANGES_KEY)
+    return jsonify({
+        "changes": changes,
+        "next_cursor": next_cursor or request.args.get('since'),
+        "has_more": has_more
+    }), 200
+
+# Query parameters of the stream that aren't column filters
+STREAM_PARAMETERS = {'bbox', 'near', 'radius_km', 'last_event_id'}
+
+# Observations read from the database per query when a stream resumes
+STREAM_REPLAY_CHUNK = 500
+
+# How long EventSource clients wait before reconnecting, in milliseconds
+STREAM_RETRY_MS = 3000
+
+# Does a row dict lie inside ?bbox= and within ?near=? (the live counterpart of spatial_filters())
+def in_area(row, bbox, near):
+    latitude, longitude = row.get('latitude'), row.get('longitude')
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        if latitude is None or not (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon):
+            return False
+    if near is not None:
+        distance = haversine_km(latitude, longitude, near[0], near[1])
+        if distance is None or distance > near[2]:
+            return False
+    return True
+
+# Committed observations after a change feed cursor, oldest first, as events (at most `limit` of them).
+# Returns the ids sent and the cursor of the last one, so the same rows arriving live can be skipped.
+def replay_events(cursor, filters, limit):
+    statement = select_observation_columns(OBSERVATION_COLUMNS, CHANGES_KEY).where(
+        *filters, *settled_filters(), Observation.created >= cursor[0]
+    )
+    to_dict = compile_serializer(tuple(OBSERVATION_COLUMNS))[1]
+    sent = set()
+    while len(sent) < limit:
+        rows = read_session.execute(
+            statement.where(tuple_(*CHANGES_KEY) > cursor).order_by(*CHANGES_KEY).limit(min(STREAM_REPLAY_CHUNK, limit - len(sent)))
+        ).all()
+        read_session.close()  # Don't keep a pooled connection while the client reads
+        for row in rows:
+            yield event_frame(to_dict(row), row[-2:])
+            sent.add(row[-1])
+        if len(rows) < STREAM_REPLAY_CHUNK:
+            break
+        cursor = tuple(rows[-1][-2:])
+    return sent, cursor
+
+# API endpoint streaming newly committed observations as Server-Sent Events, instead of polling the list.
+# Takes the column filters of the list endpoints (?becquerel__gt=0.5) and ?bbox= / ?near=. A client that
+# reconnects with Last-Event-ID (or ?last_event_id=) first gets what it missed, from the database.
+# Events are pushed by the worker that committed them, and each open stream holds a thread, so serve it
+# from threaded (gthread) or gevent workers.
+@bp.route('/observations/stream', methods=['GET'])
+def stream_observations():
+    try:
+        conditions = parse_filters(request.args, Observation.__table__, STREAM_PARAMETERS)
+        bbox, near = spatial_params()
+        filters = [Observation.deleted.is_(None), *spatial_filters(), *filter_clauses(Observation.__table__, conditions)]
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        cursor = decode_cursor(last_event_id, CHANGES_KEY) if last_event_id else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    broker = observation_stream._get_current_object()
+    keepalive = current_app.config['STREAM_KEEPALIVE']
+    replay_limit = current_app.config['STREAM_REPLAY_LIMIT']
+
+    def events():
+        # Subscribed before replaying, so nothing committed in between is lost (replayed rows are skipped live)
+        position = broker.subscribe()
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            last = cursor or (datetime.utcnow(), '')
+            skip = set()
+            if cursor is not None:
+                skip, last = yield from replay_events(last, filters, replay_limit)
+            last_write = time.monotonic()
+            while True:
+                pending, position, missed = broker.wait(position, keepalive)
+                if missed:
+                    # More than the broker's backlog behind: catch up from the database instead
+                    skip, last = yield from replay_events(last, filters, replay_limit)
+                    last_write = time.monotonic()
+                    continue
+                for row, frame in pending:
+                    if row['id'] in skip or not (row_matches(row, conditions) and in_area(row, bbox, near)):
+                        continue
+                    last = (row['updated'], row['id'])
+                    last_write = time.monotonic()
+                    yield frame
+                # A comment now and then keeps proxies from closing an idle stream and notices dead clients
+                if time.monotonic() - last_write >= keepalive:
+                    last_write = time.monotonic()
+                    yield ": keepalive\n\n"
+        finally:
+            broker.unsubscribe()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+
+# Rows are read from the database this many at a time while exporting
+EXPORT_CHUNK_SIZE = 1000
+
+# Stream the table and the archive in chunks, merged in (date, time, id) order;
+# only EXPORT_CHUNK_SIZE rows of each are ever held in memory
+def iter_export_rows():
+    to_values = compile_serializer(tuple(OBSERVATION_COLUMNS))[0]
+    statement = (
+        select_observation_columns(OBSERVATION_COLUMNS)
+        .where(Observation.deleted.is_(None))
+        .order_by(*DATE_TIME_KEY)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    key_names = tuple(column.name for column in DATE_TIME_KEY)
+    cold_archive = get_cold_archive()
+    archived = cold_archive.iter_rows(OBSERVATION_COLUMNS, key_names, EXPORT_CHUNK_SIZE) if cold_archive is not None else []
+    for row in heapq.merge(read_session.execute(statement), archived, key=lambda row: tuple(row[-len(key_names):])):
+        yield to_values(row)
+
+def generate_ndjson():
+    for row in iter_export_rows():
+        yield json.dumps(dict(zip(OBSERVATION_COLUMNS, row))) + '\n'
+
+def generate_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(OBSERVATION_COLUMNS)
+    for row in iter_export_rows():
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+# API endpoint to export every observation as NDJSON or CSV without building the whole table in memory
+@bp.route('/observations/export', methods=['GET'])
+def export_observations():
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        generator, mimetype = generate_ndjson, 'application/x-ndjson'
+    elif export_format == 'csv':
+        generator, mimetype = generate_csv, 'text/csv'
+    else:
+        return jsonify({"error": "format must be 'ndjson' or 'csv'"}), 400
+
+    response = Response(stream_with_context(generator()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=observations.{export_format}'
+    return response
+
+# API endpoint to delete an observation by its ID
+@bp.route('/observations/<string:id>', methods=['DELETE'])
+def delete_observation(id):
+    observation = Observation.query.get(id)
+    if observation is None and archived_observation(id, ['id']) is not None:
+        return archived_conflict(id)
+    if observation is None or observation.deleted is not None:
+        return jsonify({"error": "Observation not found"}), 404
+
+    # Soft delete: the row stays as a tombstone for the change feed
+    observation.deleted = datetime.utcnow()
+    db.session.commit()
+    observation_cache.invalidate(id)
+
+    return jsonify({"message": f"Observation {id} deleted successfully"}), 200
+
+# API endpoint to get an observation by its ID
+@bp.route('/observations/<string:id>', methods=['GET'])
+def get_observation(id):
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # The body is stored behind the timestamp its validators come from, so the ETag always describes the
+    # bytes it is sent with, and a cache hit answers (or 304s) without touching the database.
+    # Observations that aren't in the table may have been moved to the archive.
+    def load():
+        statement = select(*observation_columns(Observation, fields), Observation.updated, Observation.created).where(
+            Observation.id == id, Observation.deleted.is_(None)
+        )
+        row = read_session.execute(statement).first()
+        if row is None:
+            row = archived_observation(id, list(fields) + ['updated', 'created'])
+        if row is None:
+            return None
+        last_modified = row[-2] or row[-1]
+        return last_modified.isoformat().encode() + b'\n' + current_app.json.dumps(serialize_row(row, fields)).encode()
+
+    # Full observations are served from the cache as ready-made JSON bytes; projections always hit the database
+    entry = observation_cache.get_or_load(id, load) if fields is OBSERVATION_COLUMNS else load()
+
+    if entry is None:
+        return jsonify({"error": "Observation not found"}), 404
+
+    stamp, _, body = entry.partition(b'\n')
+    validators = item_validators(id, datetime.fromisoformat(stamp.decode()))
+    if is_not_modified(*validators):
+        return not_modified_response(*validators)
+    return with_validators(Response(body, status=200, mimetype='application/json'), *validators)
+
+
+# API endpoint to update an observation by its ID
+@bp.route('/observations/<string:id>', methods=['PUT'])
+def update_observation(id):
+    observation = Observation.query.get(id)
+    if observation is None and archived_observation(id, ['id']) is not None:
+        return archived_conflict(id)
+    if observation is None or observation.deleted is not None:
+        return jsonify({"error": "Observation not found"}), 404
+
+    # Validate the fields that were sent, then update just those
+    try:
+        values = validate_update(request.get_json(), partial=True)
+    except ValidationError as e:
+        return jsonify({"error": str(e), "fields": e.errors}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    for name, value in values.items():
+        setattr(observation, name, value)
+
+    # Commit the changes to the database
+    db.session.commit()
+    observation_cache.invalidate(id)
+
+    return jsonify({"message": "Observation updated successfully", "data": observation.id}), 200
+
+# API endpoint to register a device or station ahead of its first upload
+@bp.route('/devices', methods=['POST'])
+def create_device():
+    data = request.get_json()
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Device must be a JSON object")
+        device_id = check_key(data.get('id'), 64, 'id')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if db.session.get(Device, device_id) is not None:
+        return jsonify({"error": f"Device {device_id} already exists"}), 409
+
+    db.session.add(Device(id=device_id, name=data.get('name'), coordinates=data.get('coordinates')))
+    db.session.commit()
+    return jsonify({"message": "Device created successfully", "data": device_id}), 201
+
+# API endpoint to list the registered devices
+@bp.route('/devices', methods=['GET'])
+def get_devices():
+    rows = read_session.execute(select(Device.id, Device.name, Device.coordinates, Device.created).order_by(Device.id)).all()
+    return jsonify([
+        {"id": row.id, "name": row.name, "coordinates": row.coordinates, "created": row.created.isoformat(' ', 'seconds')}
+        for row in rows
+    ]), 200
+
+# The newest observation of each device, read through the latest-reading table instead of scanning observations
+def select_latest_observations():
+    return select(*observation_columns(Observation)).join(DeviceLatest, DeviceLatest.observation_id == Observation.id)
 
-    for key, value in filters.items():
-        if hasattr(Observation, key):
-            query = query.filter(getattr(Observation, key) == value)
+# API endpoint to get the newest observation of every device
+@bp.route('/devices/latest', methods=['GET'])
+def get_latest_observations():
+    rows = read_session.execute(select_latest_observations().order_by(DeviceLatest.device_id)).all()
+    return jsonify(serialize_rows(rows)), 200
 
-    results = query.all()
-    return jsonify(obs_list_schema.dump(results)), 200
+# API endpoint to get the newest observation of one device
+@bp.route('/devices/<string:id>/latest', methods=['GET'])
+def get_device_latest(id):
+    row = read_session.execute(select_latest_observations().where(DeviceLatest.device_id == id)).first()
+    if row is None:
+        return jsonify({"error": "No observations for this device"}), 404
+    return jsonify(serialize_row(row)), 200
@@ -0,0 +1,111 @@
+# Full-text search over observation notes with an SQLite FTS5 index.
+#
+# observation_notes is an external-content FTS5 table over observation_note_text, a copy of every non-NULL
+# observation.notes with the observation's id under an INTEGER PRIMARY KEY: it stores only the index and reads
+# the text (for snippets) and the id back from there. The index can't read observation directly, as it would
+# have to be keyed on observation's implicit rowid, which VACUUM can renumber; an INTEGER PRIMARY KEY is kept
+# as is, and searches join observation on the id. Triggers keep both in step with every insert, update and
+# delete, whichever path writes (ORM, bulk insert, archiving).
+import re
+
+from sqlalchemy import column, literal_column, table
+
+NOTES_INDEX = 'observation_notes'
+NOTES_TABLE = 'observation_note_text'
+
+# The index, for selects: its rank (bm25, lower is better) and the id of the observation
+notes_index = table(NOTES_INDEX, column('id'), column('rank'))
+
+# Words of context each side of the match in snippets, and how matches are marked
+SNIPPET_TOKENS = 12
+SNIPPET_MARKS = ('<mark>', '</mark>', '…')
+
+# Index and copy a new note, or remove an old one, by observation id
+_ADD_NOTE = f"""INSERT INTO {NOTES_TABLE}(id, notes) SELECT {{row}}.id, {{row}}.notes WHERE {{row}}.notes IS NOT NULL;
+            INSERT INTO {NOTES_INDEX}(rowid, notes, id) SELECT note_id, notes, id FROM {NOTES_TABLE} WHERE id = {{row}}.id;"""
+_REMOVE_NOTE = f"""INSERT INTO {NOTES_INDEX}({NOTES_INDEX}, rowid, notes, id) SELECT 'delete', note_id, notes, id FROM {NOTES_TABLE} WHERE id = {{row}}.id;
+            DELETE FROM {NOTES_TABLE} WHERE id = {{row}}.id;"""
+
+CREATE_STATEMENTS = [
+    f"CREATE TABLE IF NOT EXISTS {NOTES_TABLE} (note_id INTEGER PRIMARY KEY, id VARCHAR(36) NOT NULL UNIQUE, notes TEXT NOT NULL)",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {NOTES_INDEX} USING fts5(notes, id UNINDEXED, content='{NOTES_TABLE}', "
+    f"content_rowid='note_id', tokenize='porter unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS {NOTES_INDEX}_insert AFTER INSERT ON observation
+        WHEN new.notes IS NOT NULL BEGIN
+            {_ADD_NOTE.format(row='new')}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {NOTES_INDEX}_delete AFTER DELETE ON observation
+        WHEN old.notes IS NOT NULL BEGIN
+            {_REMOVE_NOTE.format(row='old')}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {NOTES_INDEX}_update AFTER UPDATE OF id, notes ON observation BEGIN
+            {_REMOVE_NOTE.format(row='old')}
+            {_ADD_NOTE.format(row='new')}
+        END""",
+]
+
+# The first layout indexed observation by rowid directly, with triggers of the same names
+DROP_STATEMENTS = [
+    f"DROP TRIGGER IF EXISTS {NOTES_INDEX}_insert",
+    f"DROP TRIGGER IF EXISTS {NOTES_INDEX}_delete",
+    f"DROP TRIGGER IF EXISTS {NOTES_INDEX}_update",
+    f"DROP TABLE IF EXISTS {NOTES_INDEX}",
+]
+
+
+def is_supported(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+# Create the index and its triggers if they're missing (replacing an index of the first layout), filling a new
+# index from the notes already stored. Returns whether it was created.
+def create_notes_index(connection):
+    if not is_supported(connection):
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (NOTES_TABLE,)
+    ).first() is not None
+    if not exists:
+        for statement in DROP_STATEMENTS:
+            connection.exec_driver_sql(statement)
+    for statement in CREATE_STATEMENTS:
+        connection.exec_driver_sql(statement)
+    if not exists:
+        rebuild_notes_index(connection)
+    return not exists
+
+
+# Re-copy every note from observation and rebuild the index from the copies
+def rebuild_notes_index(connection):
+    connection.exec_driver_sql(f"DELETE FROM {NOTES_TABLE}")
+    connection.exec_driver_sql(f"INSERT INTO {NOTES_TABLE}(id, notes) SELECT id, notes FROM observation WHERE notes IS NOT NULL")
+    connection.exec_driver_sql(f"INSERT INTO {NOTES_INDEX}({NOTES_INDEX}) VALUES ('rebuild')")
+
+
+# A search box string as an FTS5 query: every word must appear (in any form the stemmer folds together),
+# a trailing * makes a word a prefix, and "quoted words" must appear as a phrase. Anything else is
+# dropped, so user input can't produce an FTS5 syntax error.
+def parse_search(value):
+    terms = []
+    for phrase, word, prefix in re.findall(r'"([^"]*)"|(\w+)(\*?)', value or ''):
+        if phrase:
+            words = re.findall(r'\w+', phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+        elif word:
+            terms.append(f'"{word}"{prefix}')
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    return ' '.join(terms)
+
+
+# The MATCH condition and the snippet column for a parsed query
+def match_clause(query):
+    return literal_column(NOTES_INDEX).match(query)
+
+
+def snippet_column():
+    opening, closing, ellipsis = SNIPPET_MARKS
+    return literal_column(
+        f"snippet({NOTES_INDEX}, 0, '{opening}', '{closing}', '{ellipsis}', {SNIPPET_TOKENS})"
+    ).label('snippet')
@@ -0,0 +1,75 @@
+from functools import lru_cache
+
+# Every column of an observation, in the order the API returns them
+OBSERVATION_COLUMNS = [
+    'id', 'date', 'time', 'time_zone_offset', 'coordinates', 'temperature_water', 'temperature_air',
+    'humidity', 'wind_speed', 'wind_direction', 'precipitation', 'haze', 'becquerel', 'notes',
+    'device_id', 'created', 'updated', 'deleted'
+]
+
+# Numeric readings that can be aggregated
+METRIC_COLUMNS = [
+    'temperature_water', 'temperature_air', 'humidity', 'wind_speed', 'wind_direction', 'precipitation',
+    'haze', 'becquerel'
+]
+
+
+def format_timestamp(value):
+    return value.isoformat(' ', 'seconds')
+
+
+# Columns that need converting before they can go into JSON; everything else is already a str/float
+FORMATTERS = {
+    'date': lambda value: value.isoformat(),
+    'time': lambda value: value.isoformat(),
+    'created': format_timestamp,
+    'updated': format_timestamp,
+    'deleted': format_timestamp,
+}
+
+
+# The table columns for a list of field names, for select(*observation_columns(Observation, fields))
+def observation_columns(model, fields=OBSERVATION_COLUMNS):
+    return [model.__table__.c[name] for name in fields]
+
+
+# Turn "?fields=date,time,becquerel" into a list of known column names
+def parse_fields(fields_arg):
+    if not fields_arg:
+        return OBSERVATION_COLUMNS
+    fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in OBSERVATION_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+# Build the row formatter for a set of fields once and reuse it for every row.
+# Rows are plain result tuples whose first len(fields) values line up with fields;
+# any extra trailing values (e.g. the pagination key) are ignored.
+@lru_cache(maxsize=128)
+def compile_serializer(fields):
+    count = len(fields)
+    formatters = [(index, FORMATTERS[name]) for index, name in enumerate(fields) if name in FORMATTERS]
+
+    def to_values(row):
+        values = list(row[:count])
+        for index, formatter in formatters:
+            value = values[index]
+            if value is not None:
+                values[index] = formatter(value)
+        return values
+
+    def to_dict(row):
+        return dict(zip(fields, to_values(row)))
+
+    return to_values, to_dict
+
+
+def serialize_row(row, fields=OBSERVATION_COLUMNS):
+    return compile_serializer(tuple(fields))[1](row)
+
+
+def serialize_rows(rows, fields=OBSERVATION_COLUMNS):
+    to_dict = compile_serializer(tuple(fields))[1]
+    return [to_dict(row) for row in rows]
@@ -0,0 +1,169 @@
+# Statistics over metric columns loaded as NumPy arrays: percentiles, trailing rolling baselines,
+# z-score anomaly flags and correlations. Every step is a handful of whole-array operations,
+# so the cost is a few passes over memory whatever the number of readings.
+import re
+
+import numpy as np
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_WINDOW = '1h'
+DEFAULT_THRESHOLD = 3.0
+# Readings a baseline needs before a reading can be flagged against it
+MIN_BASELINE = 10
+# Rolling points returned per metric by default, and at most
+DEFAULT_POINTS = 200
+MAX_POINTS = 5000
+# Anomalies listed per metric (all of them are counted)
+MAX_ANOMALIES = 1000
+
+WINDOW_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)([smhd])$')
+WINDOW_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+# DBAPI rows fetched per round trip when loading readings
+FETCH_CHUNK = 10000
+
+
+# Fill a preallocated (count, width) float array from a DBAPI cursor, FETCH_CHUNK rows at a time, so the
+# rows never all exist as Python tuples at once; None becomes NaN. Returns the rows actually filled.
+def fetch_array(cursor, count, width):
+    array = np.empty((count, width))
+    filled = 0
+    while filled < count:
+        rows = cursor.fetchmany(min(FETCH_CHUNK, count - filled))
+        if not rows:
+            break
+        array[filled:filled + len(rows)] = rows
+        filled += len(rows)
+    return array[:filled]
+
+
+# "90s", "15m", "1h", "7d" -> seconds
+def parse_window(value):
+    match = WINDOW_PATTERN.match(value.strip())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError("window must be a number followed by s, m, h or d, e.g. 1h")
+    return float(match.group(1)) * WINDOW_UNITS[match.group(2)]
+
+
+# "5,50,95" -> [5.0, 50.0, 95.0]
+def parse_percentiles(value):
+    try:
+        percentiles = [float(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError("percentiles must be numbers between 0 and 100")
+    if not percentiles or any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise ValueError("percentiles must be numbers between 0 and 100")
+    return percentiles
+
+
+# Seconds since 1970 -> "YYYY-MM-DD HH:MM:SS", the format the rest of the API uses
+def format_times(seconds):
+    moments = (np.asarray(seconds) * 1e6).astype('int64').astype('datetime64[us]')
+    return [text.replace('T', ' ') for text in np.datetime_as_string(moments, unit='s')]
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+# count/mean/std/min/max and the requested percentiles of the non-missing values
+def summarize(values, percentiles):
+    present = values[~np.isnan(values)]
+    if not len(present):
+        return {"count": 0, "mean": None, "std": None, "min": None, "max": None,
+                "percentiles": {f"p{percentile:g}": None for percentile in percentiles}}
+    return {
+        "count": int(len(present)),
+        "mean": float(present.mean()),
+        "std": float(present.std()),
+        "min": float(present.min()),
+        "max": float(present.max()),
+        "percentiles": {f"p{percentile:g}": float(value)
+                        for percentile, value in zip(percentiles, np.percentile(present, percentiles))},
+    }
+
+
+# Position of the first reading inside each reading's trailing window [t - window, t]
+def window_starts(times, window):
+    return np.searchsorted(times, times - window, side='left')
+
+
+# Running totals of a metric, from which any window's mean/std/count is O(1).
+# Values are centred first so the sum of squares keeps its precision.
+def prefix_sums(values):
+    present = ~np.isnan(values)
+    centre = values[present].mean() if present.any() else 0.0
+    centred = np.where(present, values - centre, 0.0)
+    return (
+        centre,
+        np.concatenate([[0.0], np.cumsum(centred)]),
+        np.concatenate([[0.0], np.cumsum(centred * centred)]),
+        np.concatenate([[0], np.cumsum(present)]),
+    )
+
+
+# Mean, standard deviation and count of the readings at positions [first, last)
+def window_stats(prefix, first, last):
+    centre, sums, squares, counts = prefix
+    count = counts[last] - counts[first]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[last] - sums[first]) / count
+        variance = (squares[last] - squares[first]) / count - mean * mean
+    return mean + centre, np.sqrt(np.maximum(variance, 0.0)), count
+
+
+# Readings more than threshold standard deviations from the mean of the readings in the window
+# before them (the window excludes the reading itself)
+def find_anomalies(times, values, prefix, starts, threshold):
+    mean, std, count = window_stats(prefix, starts, np.arange(len(values)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (values - mean) / std
+    flagged = np.flatnonzero((count >= MIN_BASELINE) & (std > 0) & (np.abs(z) > threshold))
+    listed = flagged[:MAX_ANOMALIES]
+    return len(flagged), [
+        {"time": moment, "value": float(values[index]), "baseline": float(mean[index]), "z": float(z[index])}
+        for moment, index in zip(format_times(times[listed]), listed)
+    ]
+
+
+# The rolling mean/std (window including each reading) at up to `points` evenly spaced readings;
+# only those windows are evaluated
+def rolling_series(times, prefix, starts, points):
+    if not points or not len(times):
+        return []
+    picked = np.unique(np.linspace(0, len(times) - 1, min(points, len(times))).astype('int64'))
+    mean, std, _ = window_stats(prefix, starts[picked], picked + 1)
+    return [
+        {"time": moment, "mean": _number(mean[position]), "std": _number(std[position])}
+        for position, moment in enumerate(format_times(times[picked]))
+    ]
+
+
+# Pearson correlation between every pair of metrics, over the readings that have all of them
+def correlations(columns):
+    names = list(columns)
+    if len(names) < 2:
+        return {}
+    matrix = np.column_stack([columns[name] for name in names])
+    matrix = matrix[~np.isnan(matrix).any(axis=1)]
+    if len(matrix) < 2:
+        return {name: {other: None for other in names} for name in names}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coefficients = np.corrcoef(matrix, rowvar=False)
+    return {name: {other: _number(coefficients[row, column]) for column, other in enumerate(names)}
+            for row, name in enumerate(names)}
+
+
+# The whole /observations/stats body for time-sorted epoch seconds and {metric: float array}
+def compute_stats(times, columns, percentiles, window, threshold, points):
+    starts = window_starts(times, window)
+    metrics = {}
+    for name, values in columns.items():
+        prefix = prefix_sums(values)
+        entry = summarize(values, percentiles)
+        entry["anomaly_count"], entry["anomalies"] = find_anomalies(times, values, prefix, starts, threshold)
+        entry["rolling"] = rolling_series(times, prefix, starts, points)
+        metrics[name] = entry
+    return {"count": int(len(times)), "metrics": metrics, "correlations": correlations(columns)}
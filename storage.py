@@ -0,0 +1,122 @@
+# Connection setup and read/write routing for the app's database.
+#
+# Writes go through db.session. Against a SQLite file its engine holds a single connection, so the
+# writes of one worker (request threads and the ingest writer alike) take turns on it, and every write
+# transaction starts with BEGIN IMMEDIATE: a writer in another worker then waits out busy_timeout for
+# the lock up front instead of failing with "database is locked" halfway through its transaction.
+#
+# Reads that don't need to see the request's own uncommitted writes go through read_session, backed
+# by a separate pool of query_only connections. In WAL mode those never wait for the writer.
+#
+# Against Postgres (or any other server database) the write engine keeps its normal pool and reads go
+# to a read-only pool, on a replica if SQLALCHEMY_READ_DATABASE_URI points at one.
+from functools import partial
+
+from flask import current_app, g
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+from werkzeug.local import LocalProxy
+
+from models import db
+
+
+def is_sqlite_file(url):
+    return (url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+            and url.query.get('mode') != 'memory')
+
+
+# Set on every new SQLite connection; busy_timeout comes first so switching to WAL waits for the lock too
+def sqlite_pragmas(config):
+    return {
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT'],
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        'cache_size': -(config['SQLITE_CACHE_SIZE'] // 1024),  # Negative: KiB rather than pages
+    }
+
+
+def sqlite_connect_args(config):
+    return {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000, 'check_same_thread': False}
+
+
+def _apply_pragmas(pragmas, dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+# The writer manages its own transactions (the sqlite3 module would otherwise open them lazily with a
+# plain BEGIN), so the begin hook below can take the write lock at the start
+def _configure_writer(pragmas, dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+    _apply_pragmas(pragmas, dbapi_connection)
+
+
+def _begin_immediate(connection):
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def _configure_reader(pragmas, dbapi_connection, connection_record):
+    _apply_pragmas(dict(pragmas, query_only='ON'), dbapi_connection)
+
+
+# Bind db to the app with the write engine profile, and create the read engine next to it.
+# Anything already in SQLALCHEMY_ENGINE_OPTIONS wins over the defaults here.
+def init_app(app):
+    config = app.config
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    sqlite_file = is_sqlite_file(url)
+    if sqlite_file:
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = dict({
+            'poolclass': QueuePool,
+            'pool_size': 1,
+            'max_overflow': 0,
+            'pool_timeout': config['WRITE_POOL_TIMEOUT'],
+            'connect_args': sqlite_connect_args(config),
+        }, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    db.init_app(app)
+    with app.app_context():
+        writer = db.engine
+
+    if sqlite_file:
+        pragmas = sqlite_pragmas(config)
+        event.listen(writer, 'connect', partial(_configure_writer, pragmas))
+        event.listen(writer, 'begin', _begin_immediate)
+        reader = create_engine(
+            writer.url, poolclass=QueuePool, pool_size=config['READ_POOL_SIZE'], max_overflow=config['READ_POOL_SIZE'],
+            connect_args=sqlite_connect_args(config)
+        )
+        event.listen(reader, 'connect', partial(_configure_reader, pragmas))
+    elif url.get_backend_name() == 'sqlite':
+        reader = None  # In-memory: there is only the one connection, so reads share the write session
+    else:
+        options = {'postgresql_readonly': True} if url.get_backend_name() == 'postgresql' else {}
+        reader = create_engine(
+            config['SQLALCHEMY_READ_DATABASE_URI'] or writer.url, pool_size=config['READ_POOL_SIZE'],
+            max_overflow=config['READ_POOL_SIZE'], pool_pre_ping=True, execution_options=options
+        )
+    app.extensions['read_engine'] = reader
+    app.teardown_appcontext(close_read_session)
+
+
+# One read session per app context (so per request), opened on first use
+def get_read_session():
+    engine = current_app.extensions['read_engine']
+    if engine is None:
+        return db.session
+    if 'read_session' not in g:
+        g.read_session = Session(engine)
+    return g.read_session
+
+
+def close_read_session(exception=None):
+    session = g.pop('read_session', None)
+    if session is not None:
+        session.close()
+
+
+read_session = LocalProxy(get_read_session)
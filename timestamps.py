@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+import re
+
+# "+01:00", "-0530", "+1", "UTC+02:00", "GMT-3", "Z", "UTC"
+OFFSET_PATTERN = re.compile(r'^(?:UTC|GMT)?\s*(?:([+-])(\d{1,2})(?::?(\d{2}))?)?$', re.IGNORECASE)
+
+
+# Turn a device's time_zone_offset string into a timedelta east of UTC
+def parse_utc_offset(value):
+    if value is None:
+        raise ValueError("time_zone_offset is required")
+    value = str(value).strip()
+    if value.upper() == 'Z':
+        return timedelta(0)
+
+    match = OFFSET_PATTERN.match(value)
+    if not match or not value:
+        raise ValueError(f"Invalid time_zone_offset: {value}")
+    sign, hours, minutes = match.groups()
+    if sign is None:
+        return timedelta(0)
+
+    offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+    if offset > timedelta(hours=14):
+        raise ValueError(f"Invalid time_zone_offset: {value}")
+    return offset if sign == '+' else -offset
+
+
+# Combine the local date and time a reading was taken at into a naive UTC datetime
+def to_utc(date, time, time_zone_offset):
+    return datetime.combine(date, time) - parse_utc_offset(time_zone_offset)
+
+
+# Parse a ?start= / ?end= bound: a date ("2024-01-31") or an ISO datetime with optional offset.
+# Naive datetimes are taken as UTC. A bare end date covers that whole day, so it is returned
+# together with whether the bound is exclusive.
+def parse_range_bound(value, end=False):
+    if len(value) == 10:
+        day = datetime.strptime(value, '%Y-%m-%d')
+        if end:
+            return day + timedelta(days=1), True
+        return day, False
+
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment, False
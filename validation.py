@@ -0,0 +1,145 @@
+# Validation of incoming observations, compiled once from the model's column definitions.
+#
+# Every column a client may send gets one parser picked from its SQLAlchemy type (ISO dates and times,
+# finite numbers within VALUE_RANGES, strings no longer than the column), so a record is checked in a
+# single pass over the fields with no per-request setup. All of a record's problems are reported at once.
+from datetime import date, time
+from functools import lru_cache
+import math
+
+from sqlalchemy import Date, Float, String, Time
+
+from serializers import METRIC_COLUMNS
+from timestamps import parse_utc_offset
+
+# Physical limits of the readings, inclusive; None leaves that side open
+VALUE_RANGES = {
+    'humidity': (0, 100),
+    'wind_direction': (0, 360),
+    'wind_speed': (0, None),
+    'precipitation': (0, None),
+    'haze': (0, None),
+    'becquerel': (0, None),
+}
+
+# Columns whose strings must also pass a parser: name -> (parser, what the error says it must be).
+# Devices send a handful of distinct offsets, so their parses are cached.
+STRING_CHECKS = {
+    'time_zone_offset': (lru_cache(maxsize=1024)(parse_utc_offset), "a UTC offset such as +01:00"),
+}
+
+
+# One message per failing field, {name: message}
+class ValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors.values()))
+        self.errors = errors
+
+
+def _parse_date(value):
+    return date.fromisoformat(value)
+
+
+def _parse_time(value):
+    parsed = time.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        raise ValueError
+    return parsed
+
+
+def _float_parser(low, high):
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+
+    def parse(value):
+        if value.__class__ is bool:
+            raise ValueError
+        number = float(value)
+        if not (low <= number <= high and math.isfinite(number)):
+            raise ValueError
+        return number
+    return parse
+
+
+def _string_parser(length, check):
+    def parse(value):
+        if value.__class__ is not str or (length is not None and not 0 < len(value) <= length):
+            raise ValueError
+        if check is not None:
+            check(value)
+        return value
+    return parse
+
+
+def _range_text(low, high):
+    if low is None and high is None:
+        return "a number"
+    if high is None:
+        return f"a number of at least {low}"
+    return f"a number between {low} and {high}"
+
+
+# (parser, error message) for one column; parsers raise TypeError or ValueError on bad input
+def column_parser(name, column):
+    column_type = column.type
+    if isinstance(column_type, Float):
+        low, high = VALUE_RANGES.get(name, (None, None))
+        return _float_parser(low, high), f"'{name}' must be {_range_text(low, high)}"
+    if isinstance(column_type, Date):
+        return _parse_date, f"'{name}' must be an ISO date (YYYY-MM-DD)"
+    if isinstance(column_type, Time):
+        return _parse_time, f"'{name}' must be an ISO time (HH:MM:SS)"
+    if isinstance(column_type, String):
+        check, description = STRING_CHECKS.get(name, (None, None))
+        length = column_type.length
+        if description is None:
+            description = f"a string of at most {length} characters" if length else "a string"
+        return _string_parser(length, check), f"'{name}' must be {description}"
+    raise TypeError(f"No parser for column {name} of type {column_type}")
+
+
+# Build the validator for `fields` of a table. validate(data) returns a row dict with every field (None when
+# not sent); validate(data, partial=True) only the fields that were sent, for updates. Unknown keys are ignored.
+def compile_validator(table, fields, required=()):
+    steps = [(name, name in required, f"'{name}' is required.") + column_parser(name, table.c[name]) for name in fields]
+
+    def validate(data, partial=False):
+        if not isinstance(data, dict):
+            raise ValueError("Observation must be a JSON object")
+        row = {}
+        errors = None
+        for name, is_required, missing, parse, invalid in steps:
+            value = data.get(name)
+            if value is None:
+                if partial and name not in data:
+                    continue
+                if is_required:
+                    errors = errors or {}
+                    errors[name] = missing
+                row[name] = None
+                continue
+            try:
+                row[name] = parse(value)
+            except (TypeError, ValueError):
+                errors = errors or {}
+                errors[name] = invalid
+        if errors:
+            raise ValidationError(errors)
+        return row
+    return validate
+
+
+# The number checks alone, for rows decoded from binary records (their types are fixed by the format):
+# every reading must be finite, since float32 fields can carry infinities, and within VALUE_RANGES
+def check_ranges(row):
+    errors = {}
+    for name in METRIC_COLUMNS:
+        value = row.get(name)
+        if value is None:
+            continue
+        low, high = VALUE_RANGES.get(name, (None, None))
+        if not math.isfinite(value) or (low is not None and value < low) or (high is not None and value > high):
+            errors[name] = f"'{name}' must be {_range_text(low, high)}"
+    if errors:
+        raise ValidationError(errors)
+    return row
@@ -0,0 +1,6 @@
+# The app for WSGI servers and the flask CLI, built once per worker process:
+#   gunicorn --workers 4 wsgi:app
+#   flask --app wsgi run
+from app import create_app
+
+app = create_app()